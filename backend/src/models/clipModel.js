@@ -29,6 +29,9 @@ const mongoose = require('mongoose');
  *         thumbnail:
  *           type: string
  *           description: The thumbnail of the clip
+ *         preview:
+ *           type: string
+ *           description: Short low-resolution preview video of the clip
  *         streamer:
  *           type: string
  *           description: The name of the streamer
@@ -134,6 +137,7 @@ const clipSchema = new mongoose.Schema({
   link: { type: String },
   url: { type: String, required: true },
   thumbnail: { type: String },
+  preview: { type: String },
   streamer: { type: String, required: true },
   submitter: { type: String, required: true },
   title: { type: String, required: true },
@@ -52,6 +52,9 @@ const PublicConfigSchema = new mongoose.Schema({
  *           items:
  *             type: string
  *           description: List of streamer usernames that are blacklisted
+ *         botMaxConcurrentClips:
+ *           type: number
+ *           description: Clips the Discord bot transcodes at once (0 lets the bot size it from its CPU count)
  *         backendUrl:
  *           type: string
  *           description: Backend URL for the Discord bot
@@ -82,6 +85,11 @@ const AdminConfigSchema = new mongoose.Schema({
   blacklistedStreamers: {
     type: [String],
     default: []
+  },
+  botMaxConcurrentClips: {
+    type: Number,
+    default: 0,
+    min: 0
   }
 });
 
@@ -9,6 +9,7 @@ const ReportMessage = require('../models/reportMessageModel');
 const Notification = require('../models/notificationModel');
 const Clip = require('../models/clipModel');
 const authorizeRoles = require('./middleware/AuthorizeRoles');
+const WebSocketManager = require('../utils/WebSocketManager');
 const botToken = process.env.DISCORD_BOT_TOKEN;
 
 /**
@@ -504,6 +505,11 @@ router.put('/config', authorizeRoles(['admin']), async (req, res) => {
     // Save both configs
     await Promise.all([adminConfig.save(), publicConfig.save()]);
     
+    const io = req.app.get('io');
+    if (io) {
+      new WebSocketManager(io).emitAdminConfigUpdated();
+    }
+    
     res.json({ message: 'Configuration updated successfully' });
   } catch (error) {
     console.error('Error updating config:', error);
@@ -21,6 +21,7 @@ const ReportMessage = require('../models/reportMessageModel');
 const authorizeRoles = require('./middleware/AuthorizeRoles');
 const searchLimiter = require('./middleware/SearchLimiter');
 const clipUpload = require('./storage/ClipUpload');
+const { createUploadSession, getUploadSession, appendUploadChunk, isUploadActive, finalizeUpload, maxChunkBytes } = require('./storage/ChunkedClipUpload');
 const Notification = require('../models/notificationModel');
 const User = require('../models/userModel');
 const Rating = require('../models/ratingModel');
@@ -1197,7 +1198,292 @@ async function downloadClipFromUrl(url) {
     });
 }
 
-router.post('/', authorizeRoles(['uploader', 'admin']), clipUpload.single('clip'), async (req, res) => {
+// Poster image and short preview an uploader (the Discord bot) rendered alongside the clip
+const clipArtifactFields = [{ name: 'poster', maxCount: 1 }, { name: 'preview', maxCount: 1 }];
+
+function uploadedArtifacts(req) {
+    return {
+        poster: req.files?.poster?.[0],
+        preview: req.files?.preview?.[0]
+    };
+}
+
+/**
+ * Move an artifact uploaded with a clip next to it, named after the clip
+ * @param {Object} artifact - Multer file, or undefined if none was sent
+ * @param {string} clipPath - Full path of the stored clip
+ * @param {string} suffix - Name suffix, e.g. `thumbnail`
+ * @returns {string|null} URL of the stored artifact
+ */
+function storeClipArtifact(artifact, clipPath, suffix) {
+    if (!artifact) {
+        return null;
+    }
+    // An uploader that failed to render an artifact while streaming sends it empty
+    if (artifact.size === 0) {
+        fs.unlinkSync(artifact.path);
+        return null;
+    }
+    const uploadsBaseDir = path.join(__dirname, '..', 'uploads');
+    const targetPath = path.join(path.dirname(clipPath), `${path.parse(clipPath).name}_${suffix}${path.extname(artifact.originalname)}`);
+    fs.renameSync(artifact.path, targetPath);
+    return `${backendUrl}/uploads/${path.relative(uploadsBaseDir, targetPath).replace(/\\/g, '/')}`;
+}
+
+/**
+ * Compress an uploaded clip and generate its thumbnail next to it.
+ * Clips that arrive with a poster were already transcoded in the pass that rendered it,
+ * so they are stored as-is without decoding them again.
+ * @param {Object} file - Stored file with `path` (inside the uploads folder) and `filename`
+ * @param {Object} [artifacts] - Optional `poster` and `preview` files uploaded with the clip
+ * @returns {Promise<{fileUrl: string, thumbnailUrl: string, previewUrl: string|null}>}
+ */
+async function processUploadedClip(file, artifacts = {}) {
+    // file.path already contains the full path with season/date structure
+    const uploadPath = file.path;
+    const uploadsBaseDir = path.join(__dirname, '..', 'uploads');
+    const relativePath = path.relative(uploadsBaseDir, uploadPath);
+    
+    console.log("File uploaded to:", uploadPath);
+    console.log("Relative path:", relativePath);
+
+    // Use relative path for URL to support both legacy and new structure
+    const fileUrl = `${backendUrl}/uploads/${relativePath.replace(/\\/g, '/')}`;
+    const previewUrl = storeClipArtifact(artifacts.preview, uploadPath, 'preview');
+    const posterUrl = storeClipArtifact(artifacts.poster, uploadPath, 'thumbnail');
+    if (posterUrl) {
+        console.log("Using uploaded poster:", posterUrl);
+        return { fileUrl, thumbnailUrl: posterUrl, previewUrl };
+    }
+    
+    try {
+        // Compress the video file with ffmpeg (same as Discord bot)
+        await compressVideo(uploadPath);
+        console.log("Video compressed successfully");
+    } catch (compressionError) {
+        console.error("Error compressing video:", compressionError);
+        // Continue with uncompressed video if compression fails
+    }
+
+    // Generate thumbnail in the same directory as the video
+    const thumbnailFilename = `${path.parse(file.filename).name}_thumbnail.png`;
+    const thumbnailDirectory = path.dirname(uploadPath);
+    const thumbnailPath = path.join(thumbnailDirectory, thumbnailFilename);
+    const thumbnailRelativePath = path.relative(uploadsBaseDir, thumbnailPath);
+    
+    console.log("Generating thumbnail:", thumbnailFilename);
+
+    await new Promise((resolve, reject) => {
+        ffmpeg(uploadPath)
+            .screenshots({
+                timestamps: ['00:00:00.001'],
+                filename: thumbnailFilename,
+                folder: thumbnailDirectory,
+                size: '640x360',
+            })
+            .on('end', resolve)
+            .on('error', reject);
+    });
+
+    const thumbnailUrl = `${backendUrl}/uploads/${thumbnailRelativePath.replace(/\\/g, '/')}`;
+    console.log("Thumbnail URL:", thumbnailUrl);
+    return { fileUrl, thumbnailUrl, previewUrl };
+}
+
+/**
+ * Save a new clip in the current season and update the clip count
+ * @returns {Promise<Object>} The saved clip
+ */
+async function saveNewClip({ fileUrl, thumbnailUrl, previewUrl, streamer, submitter, title, link, discordSubmitterId }) {
+    // Get current season and year
+    const { season, year } = getCurrentSeason();
+
+    const newClip = new Clip({ 
+        url: fileUrl, 
+        thumbnail: thumbnailUrl, 
+        preview: previewUrl,
+        streamer, 
+        submitter, 
+        title, 
+        link,
+        discordSubmitterId,
+        season: season.charAt(0).toUpperCase() + season.slice(1), // Capitalize first letter
+        year: year
+    });
+    await newClip.save();
+
+    console.log("New clip saved:", newClip);
+
+    // Update clip count in config
+    await updateClipCount();
+    return newClip;
+}
+
+/**
+ * @swagger
+ * /api/clips/uploads:
+ *   post:
+ *     summary: Start a resumable clip upload
+ *     description: Creates an upload session; the clip is then sent in chunks with PUT /api/clips/uploads/{uploadId}
+ *     tags: [Clips]
+ *     security:
+ *       - bearerAuth: []
+ *     requestBody:
+ *       required: true
+ *       content:
+ *         application/json:
+ *           schema:
+ *             type: object
+ *             properties:
+ *               filename:
+ *                 type: string
+ *               size:
+ *                 type: number
+ *     responses:
+ *       200:
+ *         description: Upload session created
+ *       400:
+ *         description: Missing filename or size
+ */
+router.post('/uploads', authorizeRoles(['uploader', 'admin']), (req, res) => {
+    try {
+        const { filename, size } = req.body;
+        if (!filename || !Number.isInteger(size) || size <= 0) {
+            return res.status(400).json({ error: 'filename and a positive integer size are required' });
+        }
+        res.json(createUploadSession(filename, size));
+    } catch (error) {
+        console.error("Error starting clip upload:", error);
+        res.status(500).json({ error: 'Internal Server Error' });
+    }
+});
+
+/**
+ * @swagger
+ * /api/clips/uploads/{uploadId}:
+ *   get:
+ *     summary: Get the acknowledged offset of a resumable clip upload
+ *     tags: [Clips]
+ *     security:
+ *       - bearerAuth: []
+ *     responses:
+ *       200:
+ *         description: Upload session with the number of bytes stored so far
+ *       404:
+ *         description: Upload not found
+ */
+router.get('/uploads/:uploadId', authorizeRoles(['uploader', 'admin']), (req, res) => {
+    const session = getUploadSession(req.params.uploadId);
+    if (!session) {
+        return res.status(404).json({ error: 'Upload not found' });
+    }
+    res.json({ uploadId: session.uploadId, offset: session.offset, size: session.size });
+});
+
+/**
+ * @swagger
+ * /api/clips/uploads/{uploadId}:
+ *   put:
+ *     summary: Append a chunk to a resumable clip upload
+ *     description: The raw request body is appended at the offset given in the Upload-Offset header
+ *     tags: [Clips]
+ *     security:
+ *       - bearerAuth: []
+ *     responses:
+ *       200:
+ *         description: Chunk stored, returns the new offset
+ *       404:
+ *         description: Upload not found
+ *       409:
+ *         description: Offset mismatch or a chunk is already being written; returns the current offset
+ *       413:
+ *         description: Chunk runs past the declared upload size or the chunk limit; nothing of it is stored
+ */
+router.put('/uploads/:uploadId', authorizeRoles(['uploader', 'admin']), async (req, res) => {
+    try {
+        const session = getUploadSession(req.params.uploadId);
+        if (!session) {
+            return res.status(404).json({ error: 'Upload not found' });
+        }
+        const offset = parseInt(req.headers['upload-offset'], 10);
+        if (offset !== session.offset || isUploadActive(session.uploadId)) {
+            return res.status(409).json({ error: 'Offset mismatch', offset: session.offset });
+        }
+        // Checked up front when the header is present; appendUploadChunk counts the bytes either way
+        const length = parseInt(req.headers['content-length'], 10);
+        if (length && (offset + length > session.size || length > maxChunkBytes)) {
+            res.set('Connection', 'close');
+            return res.status(413).json({ error: 'Chunk exceeds the declared upload size or the chunk limit', offset: session.offset });
+        }
+
+        const newOffset = await appendUploadChunk(req, session);
+        res.json({ uploadId: session.uploadId, offset: newOffset, size: session.size });
+    } catch (error) {
+        if (error.status === 413) {
+            res.set('Connection', 'close');
+            return res.status(413).json({ error: error.message, offset: error.offset });
+        }
+        console.error("Error storing clip chunk:", error);
+        res.status(500).json({ error: 'Internal Server Error' });
+    }
+});
+
+/**
+ * @swagger
+ * /api/clips/uploads/{uploadId}/complete:
+ *   post:
+ *     summary: Finish a resumable clip upload and create the clip
+ *     tags: [Clips]
+ *     security:
+ *       - bearerAuth: []
+ *     description: Send multipart/form-data instead of JSON to include a `poster` image and `preview` video rendered by the uploader
+ *     requestBody:
+ *       required: true
+ *       content:
+ *         application/json:
+ *           schema:
+ *             type: object
+ *             properties:
+ *               streamer:
+ *                 type: string
+ *               submitter:
+ *                 type: string
+ *               title:
+ *                 type: string
+ *               link:
+ *                 type: string
+ *               discordSubmitterId:
+ *                 type: string
+ *     responses:
+ *       200:
+ *         description: Clip created
+ *       404:
+ *         description: Upload not found
+ *       409:
+ *         description: Upload is incomplete; returns the current offset
+ */
+router.post('/uploads/:uploadId/complete', authorizeRoles(['uploader', 'admin']), clipUpload.fields(clipArtifactFields), async (req, res) => {
+    try {
+        const session = getUploadSession(req.params.uploadId);
+        if (!session) {
+            return res.status(404).json({ error: 'Upload not found' });
+        }
+        if (session.offset !== session.size || isUploadActive(session.uploadId)) {
+            return res.status(409).json({ error: 'Upload is incomplete', offset: session.offset });
+        }
+
+        const { streamer, submitter, title, link, discordSubmitterId } = req.body;
+        const { fileUrl, thumbnailUrl, previewUrl } = await processUploadedClip(finalizeUpload(session), uploadedArtifacts(req));
+        const newClip = await saveNewClip({ fileUrl, thumbnailUrl, previewUrl, streamer, submitter, title, link, discordSubmitterId });
+
+        res.json({ success: true, clip: newClip });
+    } catch (error) {
+        console.error("Error completing clip upload:", error);
+        res.status(500).json({ error: 'Internal Server Error' });
+    }
+});
+
+router.post('/', authorizeRoles(['uploader', 'admin']), clipUpload.fields([{ name: 'clip', maxCount: 1 }, ...clipArtifactFields]), async (req, res) => {
     console.log("=== Handling new clip upload ===");
     try {
         const { streamer, submitter, title, link, discordSubmitterId } = req.body;
@@ -1205,52 +1491,13 @@ router.post('/', authorizeRoles(['uploader', 'admin']), clipUpload.single('clip'
 
         let fileUrl;
         let thumbnailUrl;
+        let previewUrl;
         let finalTitle = title;
+        const clipFile = req.files?.clip?.[0];
         
         // Case 1: Direct file upload
-        if (req.file) {
-            // req.file.path already contains the full path with season/date structure
-            const uploadPath = req.file.path;
-            const uploadsBaseDir = path.join(__dirname, '..', 'uploads');
-            const relativePath = path.relative(uploadsBaseDir, uploadPath);
-            
-            console.log("File uploaded to:", uploadPath);
-            console.log("Relative path:", relativePath);
-            
-            try {
-                // Compress the video file with ffmpeg (same as Discord bot)
-                await compressVideo(uploadPath);
-                console.log("Video compressed successfully");
-            } catch (compressionError) {
-                console.error("Error compressing video:", compressionError);
-                // Continue with uncompressed video if compression fails
-            }
-
-            // Use relative path for URL to support both legacy and new structure
-            fileUrl = `${backendUrl}/uploads/${relativePath.replace(/\\/g, '/')}`;
-
-            // Generate thumbnail in the same directory as the video
-            const thumbnailFilename = `${path.parse(req.file.filename).name}_thumbnail.png`;
-            const thumbnailDirectory = path.dirname(uploadPath);
-            const thumbnailPath = path.join(thumbnailDirectory, thumbnailFilename);
-            const thumbnailRelativePath = path.relative(uploadsBaseDir, thumbnailPath);
-            
-            console.log("Generating thumbnail:", thumbnailFilename);
-
-            await new Promise((resolve, reject) => {
-                ffmpeg(uploadPath)
-                    .screenshots({
-                        timestamps: ['00:00:00.001'],
-                        filename: thumbnailFilename,
-                        folder: thumbnailDirectory,
-                        size: '640x360',
-                    })
-                    .on('end', resolve)
-                    .on('error', reject);
-            });
-
-            thumbnailUrl = `${backendUrl}/uploads/${thumbnailRelativePath.replace(/\\/g, '/')}`;
-            console.log("Thumbnail URL:", thumbnailUrl);
+        if (clipFile) {
+            ({ fileUrl, thumbnailUrl, previewUrl } = await processUploadedClip(clipFile, uploadedArtifacts(req)));
         } 
         // Case 2: URL-based clip from YouTube, Twitch, etc.
         else if (link && (link.includes('youtube.com') || link.includes('youtu.be') || 
@@ -1304,26 +1551,16 @@ router.post('/', authorizeRoles(['uploader', 'admin']), clipUpload.single('clip'
             console.log("No file or valid link provided.");
             return res.status(400).json({ error: 'No file or valid link provided' });        }
 
-        // Get current season and year
-        const { season, year } = getCurrentSeason();
-
-        const newClip = new Clip({ 
-            url: fileUrl, 
-            thumbnail: thumbnailUrl, 
-            streamer, 
-            submitter, 
-            title: finalTitle || title, 
+        const newClip = await saveNewClip({
+            fileUrl,
+            thumbnailUrl,
+            previewUrl,
+            streamer,
+            submitter,
+            title: finalTitle || title,
             link,
-            discordSubmitterId,
-            season: season.charAt(0).toUpperCase() + season.slice(1), // Capitalize first letter
-            year: year
+            discordSubmitterId
         });
-        await newClip.save();
-
-        console.log("New clip saved:", newClip);
-
-        // Update clip count in config
-        await updateClipCount();
 
         res.json({ success: true, clip: newClip });
     } catch (error) {
@@ -1416,11 +1653,13 @@ router.delete('/:id', authorizeRoles(['admin']), async (req, res) => {
                     console.log("File not found, continuing with database deletion");
                 }
                 
-                // Also try to delete thumbnail if it exists
-                const thumbnailPath = filePath.replace(/\.[^/.]+$/, '_thumbnail.png');
-                if (fs.existsSync(thumbnailPath)) {
-                    fs.unlinkSync(thumbnailPath);
-                    console.log("Thumbnail deleted successfully");
+                // Also try to delete the thumbnail (rendered here, or a poster from the uploader) and preview
+                const basePath = filePath.replace(/\.[^/.]+$/, '');
+                for (const artifactPath of [`${basePath}_thumbnail.png`, `${basePath}_thumbnail.webp`, `${basePath}_thumbnail.jpg`, `${basePath}_preview.mp4`]) {
+                    if (fs.existsSync(artifactPath)) {
+                        fs.unlinkSync(artifactPath);
+                        console.log("Deleted clip artifact:", path.basename(artifactPath));
+                    }
                 }
             } catch (error) {
                 console.error("Error removing file:", error.message);
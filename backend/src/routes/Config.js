@@ -3,6 +3,17 @@ const router = express.Router();
 const { PublicConfig, AdminConfig } = require('../models/configModel');
 const Clip = require('../models/clipModel'); // Add this import
 const authorizeRoles = require('./middleware/AuthorizeRoles');
+const WebSocketManager = require('../utils/WebSocketManager');
+
+/**
+ * Tell connected clients (the Discord bot) that the admin config changed
+ */
+function announceAdminConfigUpdate(req) {
+  const io = req.app.get('io');
+  if (io) {
+    new WebSocketManager(io).emitAdminConfigUpdated();
+  }
+}
 
 /**
  * Update the clip count in the public config
@@ -112,6 +123,8 @@ router.put('/public', authorizeRoles(['admin']), async (req, res) => {
  *     responses:
  *       200:
  *         description: Configuration retrieved successfully
+ *       304:
+ *         description: Configuration unchanged since the ETag sent in If-None-Match
  *       401:
  *         description: Unauthorized
  *       500:
@@ -125,6 +138,8 @@ router.get('/admin', authorizeRoles(['admin']), async (req, res) => {
       adminConfig = new AdminConfig();
       await adminConfig.save();
     }
+    // Clients revalidate with If-None-Match against the ETag Express derives from the body
+    res.set('Cache-Control', 'no-cache');
     res.json({ admin: adminConfig });
   } catch (error) {
     console.error('Error fetching admin config:', error);
@@ -162,6 +177,7 @@ router.put('/admin', authorizeRoles(['admin']), async (req, res) => {
       clipChannelIds, 
       blacklistedSubmitters, 
       blacklistedStreamers, 
+      botMaxConcurrentClips,
       backendUrl, 
       discordBotToken 
     } = req.body;
@@ -177,10 +193,12 @@ router.put('/admin', authorizeRoles(['admin']), async (req, res) => {
     if (clipChannelIds !== undefined) adminConfig.clipChannelIds = clipChannelIds;
     if (blacklistedSubmitters !== undefined) adminConfig.blacklistedSubmitters = blacklistedSubmitters;
     if (blacklistedStreamers !== undefined) adminConfig.blacklistedStreamers = blacklistedStreamers;
+    if (botMaxConcurrentClips !== undefined) adminConfig.botMaxConcurrentClips = botMaxConcurrentClips;
     if (backendUrl !== undefined) adminConfig.backendUrl = backendUrl;
     if (discordBotToken !== undefined) adminConfig.discordBotToken = discordBotToken;
     
     await adminConfig.save();
+    announceAdminConfigUpdate(req);
     res.json(adminConfig);
   } catch (error) {
     console.error('Error updating admin config:', error);
@@ -0,0 +1,188 @@
+const fs = require('fs');
+const path = require('path');
+const { v4: uuidv4 } = require('uuid');
+const { getClipPath } = require('../../utils/seasonHelpers');
+
+// Partial uploads live inside the uploads folder so finishing one is a cheap rename.
+// server.js serves /uploads with dotfiles: 'ignore', so nothing under .partial is ever served.
+const clipsDir = path.join(__dirname, '..', '..', 'uploads');
+const partialDir = path.join(clipsDir, '.partial');
+if (!fs.existsSync(partialDir)) {
+  fs.mkdirSync(partialDir, { recursive: true });
+}
+
+// Sessions the client gave up on (failed or dead-lettered bot jobs) are removed after this long
+const sessionTtlMs = (parseFloat(process.env.UPLOAD_SESSION_TTL_HOURS) || 24) * 60 * 60 * 1000;
+const sweepIntervalMs = 60 * 60 * 1000;
+
+// Upper bound on a single chunk, enforced on the bytes received since chunked bodies carry no Content-Length
+const maxChunkBytes = (parseFloat(process.env.UPLOAD_CHUNK_MAX_MB) || 64) * 1024 * 1024;
+
+const uploadIdPattern = /^[0-9a-f-]{36}$/;
+
+// Uploads currently receiving a chunk, to reject concurrent writes to the same file
+const activeUploads = new Set();
+
+function sessionPaths(uploadId) {
+  if (!uploadIdPattern.test(uploadId)) {
+    return null;
+  }
+  return {
+    data: path.join(partialDir, `${uploadId}.part`),
+    meta: path.join(partialDir, `${uploadId}.json`)
+  };
+}
+
+/**
+ * Start a resumable clip upload
+ *
+ * @param {string} originalName - Original filename of the clip
+ * @param {number} size - Total size of the clip in bytes
+ * @returns {Object} The new upload session
+ */
+function createUploadSession(originalName, size) {
+  const uploadId = uuidv4();
+  const paths = sessionPaths(uploadId);
+  fs.writeFileSync(paths.meta, JSON.stringify({ originalName, size, createdAt: Date.now() }));
+  fs.writeFileSync(paths.data, '');
+  return { uploadId, offset: 0, size };
+}
+
+/**
+ * Look up an upload session; the offset is the number of bytes stored so far
+ *
+ * @param {string} uploadId - ID returned by createUploadSession
+ * @returns {Object|null} The session, or null if it does not exist
+ */
+function getUploadSession(uploadId) {
+  const paths = sessionPaths(uploadId);
+  if (!paths || !fs.existsSync(paths.meta) || !fs.existsSync(paths.data)) {
+    return null;
+  }
+  const meta = JSON.parse(fs.readFileSync(paths.meta, 'utf8'));
+  return {
+    uploadId,
+    offset: fs.statSync(paths.data).size,
+    size: meta.size,
+    originalName: meta.originalName
+  };
+}
+
+/**
+ * Append the request body to an upload. Whatever arrives before a dropped connection
+ * is kept, so the client can resume from the offset reported afterwards. A chunk that
+ * runs past the declared upload size or the chunk limit is discarded entirely and the
+ * promise rejects with an error whose `status` is 413 and `offset` the unchanged offset.
+ *
+ * @param {Object} req - Express request whose body is the raw chunk
+ * @param {Object} session - Session returned by getUploadSession
+ * @returns {Promise<number>} The new offset
+ */
+function appendUploadChunk(req, session) {
+  const paths = sessionPaths(session.uploadId);
+  const limit = Math.min(session.size - session.offset, maxChunkBytes);
+  activeUploads.add(session.uploadId);
+
+  return new Promise((resolve, reject) => {
+    const output = fs.createWriteStream(paths.data, { flags: 'a' });
+    let received = 0;
+    let tooLarge = false;
+    const finish = (error) => {
+      activeUploads.delete(session.uploadId);
+      if (error) {
+        reject(error);
+      } else if (tooLarge) {
+        fs.truncateSync(paths.data, session.offset);
+        const chunkError = new Error('Chunk exceeds the declared upload size or the chunk limit');
+        chunkError.status = 413;
+        chunkError.offset = session.offset;
+        reject(chunkError);
+      } else {
+        resolve(fs.statSync(paths.data).size);
+      }
+    };
+
+    req.on('aborted', () => output.end());
+    output.on('close', () => finish());
+    output.on('error', finish);
+    req.pipe(output);
+    // Registered after pipe() so the chunk that crosses the limit is written before the stream ends;
+    // the truncate in finish() drops it again
+    req.on('data', (chunk) => {
+      received += chunk.length;
+      if (received > limit && !tooLarge) {
+        tooLarge = true;
+        req.unpipe(output);
+        output.end();
+      }
+    });
+  });
+}
+
+function isUploadActive(uploadId) {
+  return activeUploads.has(uploadId);
+}
+
+/**
+ * Move a completed upload into the season/date folder structure
+ *
+ * @param {Object} session - Session returned by getUploadSession
+ * @returns {Object} `path` and `filename` of the stored clip, like multer's req.file
+ */
+function finalizeUpload(session) {
+  const paths = sessionPaths(session.uploadId);
+  const sanitizedOriginalName = session.originalName.replace(/[^a-zA-Z0-9.-]/g, '_');
+  const filename = `${Date.now()}-${sanitizedOriginalName}`;
+  const { fullPath } = getClipPath(clipsDir, filename, new Date());
+
+  fs.renameSync(paths.data, fullPath);
+  fs.unlinkSync(paths.meta);
+  return { path: fullPath, filename };
+}
+
+/**
+ * Delete upload sessions older than the session TTL, along with stray data or
+ * metadata files whose partner is missing
+ *
+ * @returns {number} Number of files removed
+ */
+function expireUploadSessions() {
+  const cutoff = Date.now() - sessionTtlMs;
+  const uploadIds = new Set(fs.readdirSync(partialDir).map((name) => path.parse(name).name));
+  let removed = 0;
+  for (const uploadId of uploadIds) {
+    const paths = sessionPaths(uploadId);
+    if (!paths || activeUploads.has(uploadId)) {
+      continue;
+    }
+    try {
+      const files = [paths.data, paths.meta].filter((file) => fs.existsSync(file));
+      const createdAt = fs.existsSync(paths.meta)
+        ? JSON.parse(fs.readFileSync(paths.meta, 'utf8')).createdAt
+        : Math.max(...files.map((file) => fs.statSync(file).mtimeMs));
+      if (createdAt < cutoff) {
+        files.forEach((file) => fs.unlinkSync(file));
+        removed += files.length;
+      }
+    } catch (error) {
+      console.error(`Error expiring upload session ${uploadId}:`, error);
+    }
+  }
+  if (removed) {
+    console.log(`Removed ${removed} expired partial upload file(s)`);
+  }
+  return removed;
+}
+
+expireUploadSessions();
+setInterval(expireUploadSessions, sweepIntervalMs).unref();
+
+module.exports = {
+  createUploadSession,
+  getUploadSession,
+  appendUploadChunk,
+  isUploadActive,
+  finalizeUpload,
+  expireUploadSessions,
+  maxChunkBytes
+};
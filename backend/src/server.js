@@ -84,7 +84,8 @@ app.use(cors({
 }));
 
 // Static content serving
-app.use('/uploads', express.static(uploadsDir));
+// dotfiles: 'ignore' covers every path segment, which keeps uploads/.partial private
+app.use('/uploads', express.static(uploadsDir, { dotfiles: 'ignore' }));
 app.use('/profilePictures', express.static(profilePicturesDir));
 app.use('/download', express.static(downloadDir));
 
@@ -99,6 +99,14 @@ class WebSocketManager {
       timestamp: Date.now()
     });
   }
+
+  // Emit admin config change. Sockets are not verified, so only announce the change;
+  // clients re-fetch /api/config/admin with their own credentials.
+  emitAdminConfigUpdated() {
+    this.io.emit('config:admin:updated', {
+      timestamp: Date.now()
+    });
+  }
 }
 
 module.exports = WebSocketManager;
@@ -0,0 +1,367 @@
+"""Offline benchmark for the clip pipeline.
+
+Feeds synthetic Discord messages with generated test clips into bot.on_message while a
+local stub stands in for the backend, then reports throughput, latency, CPU and disk use.
+
+    python benchmark.py --clips 20 --variants 720p-h264 1080p-hevc --output run.json
+    python benchmark.py --clips 20 --set STREAMING_UPLOADS=True --baseline run.json
+
+Everything runs inside --workdir (a temporary directory by default); the real config.py,
+Discord and the production backend are never touched.
+"""
+import os
+import sys
+import ast
+import json
+import time
+import uuid
+import types
+import base64
+import shutil
+import asyncio
+import logging
+import argparse
+import resource
+import tempfile
+import itertools
+import subprocess
+from aiohttp import web
+
+CHANNEL_ID = 100000000000000001
+SUBMITTER_ID = 200000000000000002
+
+# name -> (frame size, encoder arguments)
+VARIANTS = {
+    '720p-h264': ('1280x720', ['-c:v', 'libx264', '-preset', 'veryfast', '-pix_fmt', 'yuv420p']),
+    '1080p-h264': ('1920x1080', ['-c:v', 'libx264', '-preset', 'veryfast', '-pix_fmt', 'yuv420p']),
+    '1080p-h264-highbitrate': ('1920x1080', ['-c:v', 'libx264', '-preset', 'veryfast', '-b:v', '20M', '-pix_fmt', 'yuv420p']),
+    '1080p-hevc': ('1920x1080', ['-c:v', 'libx265', '-preset', 'veryfast', '-tag:v', 'hvc1', '-pix_fmt', 'yuv420p']),
+    '720p-mpeg4': ('1280x720', ['-c:v', 'mpeg4', '-q:v', '3']),
+}
+
+def generate_clip(variant, duration, directory):
+    """Render a testsrc clip with a sine tone for a variant, reusing an earlier render if present"""
+    size, encoder_args = VARIANTS[variant]
+    path = os.path.join(directory, f'{variant}-{duration}s.mp4')
+    if os.path.exists(path):
+        return path
+    os.makedirs(directory, exist_ok=True)
+    subprocess.run([
+        'ffmpeg', '-y', '-v', 'error',
+        '-f', 'lavfi', '-i', f'testsrc=size={size}:rate=30:duration={duration}',
+        '-f', 'lavfi', '-i', f'sine=frequency=440:duration={duration}',
+        *encoder_args, '-c:a', 'aac', '-shortest', path
+    ], check=True)
+    return path
+
+class StubBackend:
+    """Local stand-in for the login, admin config and clip upload endpoints, and Discord's attachment CDN"""
+
+    def __init__(self, resumable=True):
+        self.resumable = resumable
+        self.token = None
+        self.uploads = {}  # resumable upload id -> {'data', 'size', 'filename'}
+        self.received = {}  # clip filename -> (monotonic arrival time, bytes)
+        self.attachments = {}  # attachment id -> local source file
+        self.runner = None
+
+    def issue_token(self):
+        def encode(data):
+            return base64.urlsafe_b64encode(json.dumps(data).encode()).decode().rstrip('=')
+        self.token = f"{encode({'alg': 'HS256'})}.{encode({'exp': int(time.time()) + 3600})}.benchmark"
+        return self.token
+
+    def authorized(self, request):
+        return request.headers.get('Authorization') == f'Bearer {self.token}'
+
+    def store(self, filename, size):
+        self.received[filename] = (time.monotonic(), size)
+        return web.json_response({'success': True, 'clip': {'_id': uuid.uuid4().hex}})
+
+    async def attachment(self, request):
+        return web.FileResponse(self.attachments[int(request.match_info['attachment_id'])])
+
+    async def login(self, request):
+        return web.json_response({'token': self.issue_token()})
+
+    async def admin_config(self, request):
+        if not self.authorized(request):
+            return web.json_response({'error': 'Unauthorized'}, status=403)
+        return web.json_response({'admin': {
+            'clipChannelIds': [str(CHANNEL_ID)],
+            'blacklistedSubmitters': [],
+            'blacklistedStreamers': [],
+        }})
+
+    async def upload_clip(self, request):
+        if not self.authorized(request):
+            return web.json_response({'error': 'Unauthorized'}, status=403)
+        filename, size = None, 0
+        async for part in await request.multipart():
+            if part.name == 'clip':
+                filename = part.filename
+                while chunk := await part.read_chunk():
+                    size += len(chunk)
+            else:
+                await part.release()
+        return self.store(filename, size)
+
+    async def start_upload(self, request):
+        if not self.authorized(request):
+            return web.json_response({'error': 'Unauthorized'}, status=403)
+        body = await request.json()
+        upload_id = str(uuid.uuid4())
+        self.uploads[upload_id] = {'data': 0, 'size': body['size'], 'filename': body['filename']}
+        return web.json_response({'uploadId': upload_id, 'offset': 0, 'size': body['size']})
+
+    async def get_upload(self, request):
+        upload = self.uploads.get(request.match_info['upload_id'])
+        if upload is None:
+            return web.json_response({'error': 'Upload not found'}, status=404)
+        return web.json_response({'offset': upload['data'], 'size': upload['size']})
+
+    async def put_upload_chunk(self, request):
+        upload = self.uploads.get(request.match_info['upload_id'])
+        if upload is None:
+            return web.json_response({'error': 'Upload not found'}, status=404)
+        if int(request.headers.get('Upload-Offset', -1)) != upload['data']:
+            return web.json_response({'offset': upload['data']}, status=409)
+        while chunk := await request.content.readany():
+            upload['data'] += len(chunk)
+        return web.json_response({'offset': upload['data'], 'size': upload['size']})
+
+    async def complete_upload(self, request):
+        upload = self.uploads.pop(request.match_info['upload_id'], None)
+        if upload is None:
+            return web.json_response({'error': 'Upload not found'}, status=404)
+        return self.store(upload['filename'], upload['data'])
+
+    async def start(self):
+        """Serve on a free local port and return the base URL"""
+        app = web.Application(client_max_size=1024 ** 3)
+        app.router.add_post('/api/users/login', self.login)
+        app.router.add_get('/api/config/admin', self.admin_config)
+        # The CDN host stays in the path so the bot accepts these URLs as Discord attachments
+        app.router.add_get('/cdn.discordapp.com/attachments/{channel_id}/{attachment_id}/{filename}', self.attachment)
+        app.router.add_post('/api/clips', self.upload_clip)
+        if self.resumable:
+            app.router.add_post('/api/clips/uploads', self.start_upload)
+            app.router.add_get('/api/clips/uploads/{upload_id}', self.get_upload)
+            app.router.add_put('/api/clips/uploads/{upload_id}', self.put_upload_chunk)
+            app.router.add_post('/api/clips/uploads/{upload_id}/complete', self.complete_upload)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, '127.0.0.1', 0)
+        await site.start()
+        return f'http://127.0.0.1:{self.runner.addresses[0][1]}'
+
+    async def stop(self):
+        await self.runner.cleanup()
+
+class FakeAttachment:
+    """The parts of discord.Attachment the bot uses, served from a local file by the stub"""
+    ids = itertools.count(1)
+
+    def __init__(self, stub, base_url, source, filename):
+        self.filename = filename
+        self.size = os.path.getsize(source)
+        self.id = next(self.ids)
+        self.url = f'{base_url}/cdn.discordapp.com/attachments/{CHANNEL_ID}/{self.id}/{filename}'
+        stub.attachments[self.id] = source
+
+    def __repr__(self):
+        return f"<Attachment id={self.id} filename='{self.filename}' url='{self.url}' spoiler=False>"
+
+def fake_message(message_id, attachment):
+    return types.SimpleNamespace(
+        id=message_id,
+        content='',
+        author=types.SimpleNamespace(name='benchmark', id=SUBMITTER_ID),
+        channel=types.SimpleNamespace(id=CHANNEL_ID),
+        attachments=[attachment],
+        jump_url=f'https://discord.com/channels/0/{CHANNEL_ID}/{message_id}',
+    )
+
+def install_config(backend_url, overrides):
+    """Provide the config module bot.py imports, so the real config.py is never read"""
+    module = types.ModuleType('config')
+    module.UPLOADBOT_USERNAME = 'benchmark'
+    module.UPLOADBOT_PASSWORD = 'benchmark'
+    module.BACKEND_URL = backend_url
+    module.DISCORD_BOT_TOKEN = ''
+    module.CLIP_CHANNEL_ID = []
+    module.METRICS_PORT = 0
+    module.CONFIG_PUSH_UPDATES = False
+    # Every message reuses one of a handful of rendered clips, which the dedup index would skip
+    module.DEDUP_TTL_HOURS = 0
+    for name, value in overrides.items():
+        setattr(module, name, value)
+    sys.modules['config'] = module
+
+def parse_overrides(pairs):
+    overrides = {}
+    for pair in pairs:
+        name, _, value = pair.partition('=')
+        try:
+            overrides[name] = ast.literal_eval(value)
+        except (ValueError, SyntaxError):
+            overrides[name] = value
+    return overrides
+
+def directory_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass  # removed between listing and stat
+    return total
+
+def cpu_seconds():
+    """CPU time of this process plus its reaped children (ffmpeg, ffprobe)"""
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+async def run(args):
+    workdir = os.path.abspath(args.workdir or tempfile.mkdtemp(prefix='clip-benchmark-'))
+    clips_dir = os.path.join(workdir, 'clips')
+    sources = {variant: generate_clip(variant, args.duration, clips_dir) for variant in args.variants}
+
+    # Start from an empty job database and downloads folder so runs are comparable
+    for name in ('downloads', 'logs'):
+        shutil.rmtree(os.path.join(workdir, name), ignore_errors=True)
+    os.chdir(workdir)
+
+    stub = StubBackend(resumable=not args.legacy_upload)
+    backend_url = await stub.start()
+    install_config(backend_url, parse_overrides(args.set))
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import bot
+    if not args.verbose:
+        bot.console_handler.setLevel(logging.WARNING)
+
+    await bot.start_pipeline()
+    await bot.STARTUP.run()
+
+    peak_disk = 0
+    sampling = True
+
+    async def sample_disk():
+        nonlocal peak_disk
+        while sampling:
+            peak_disk = max(peak_disk, directory_size('downloads'))
+            await asyncio.sleep(0.1)
+
+    sampler = asyncio.create_task(sample_disk())
+    sent_at = {}
+    cpu_start = cpu_seconds()
+    started = time.monotonic()
+
+    for index in range(args.clips):
+        variant = args.variants[index % len(args.variants)]
+        attachment = FakeAttachment(stub, backend_url, sources[variant], f'bench-{index:04d}-{variant}.mp4')
+        # The bot stores attachments under their id, which is also the name the clip is uploaded as
+        sent_at[f'{attachment.id}-{attachment.filename}'] = time.monotonic()
+        await bot.on_message(fake_message(index + 1, attachment))
+        if args.rate:
+            await asyncio.sleep(1 / args.rate)
+
+    # Wait for downloads, dispatch and every clip job to finish (uploaded, dropped or parked)
+    await bot.DOWNLOAD_QUEUE.join()
+    await bot.CLIP_QUEUE.join()
+    while bot.ACTIVE_JOB_IDS:
+        await asyncio.sleep(0.1)
+
+    wall = time.monotonic() - started
+    cpu = cpu_seconds() - cpu_start
+    sampling = False
+    await sampler
+
+    latencies = [arrived - sent_at[name] for name, (arrived, _) in stub.received.items() if name in sent_at]
+    uploaded = len(latencies)
+    source_bytes = sum(os.path.getsize(sources[args.variants[index % len(args.variants)]]) for index in range(args.clips))
+    uploaded_bytes = sum(size for _, size in stub.received.values())
+    # Summarise the whole run rather than the interval since the bot's last periodic summary
+    bot.METRICS.last_summary.clear()
+    result = {
+        'clips': args.clips,
+        'uploaded': uploaded,
+        'failed': args.clips - uploaded,
+        'wall_seconds': round(wall, 2),
+        'clips_per_minute': round(uploaded / wall * 60, 2) if wall else None,
+        'latency_p50_seconds': round(percentile(latencies, 0.5), 2) if latencies else None,
+        'latency_p95_seconds': round(percentile(latencies, 0.95), 2) if latencies else None,
+        'cpu_seconds_per_clip': round(cpu / uploaded, 2) if uploaded else None,
+        'peak_disk_mb': round(peak_disk / (1024 * 1024), 1),
+        'output_ratio': round(uploaded_bytes / source_bytes, 3) if source_bytes else None,
+        'variants': args.variants,
+        'settings': args.set,
+        'stages': bot.METRICS.summary(),
+    }
+
+    for task in bot.PIPELINE_TASKS:
+        task.cancel()
+    bot.drain_jobs_task.cancel()
+    bot.measure_disk_task.cancel()
+    bot.metrics_summary_task.cancel()
+    bot.DOWNLOAD_EXECUTOR.shutdown(wait=False)
+    await bot.BACKEND.close()
+    await bot.ATTACHMENTS.close()
+    await stub.stop()
+    if not args.workdir:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return result
+
+def print_report(result, baseline=None):
+    print('\n📊 Clip pipeline benchmark')
+    for key, value in result.items():
+        if key == 'stages':
+            continue
+        line = f'  {key:<22} {value}'
+        previous = baseline.get(key) if baseline else None
+        if isinstance(value, (int, float)) and isinstance(previous, (int, float)) and previous:
+            line += f'  ({(value - previous) / previous * 100:+.1f}% vs baseline {previous})'
+        print(line)
+    print('  per stage:')
+    for line in result['stages']:
+        print(f'    {line}')
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline clip pipeline benchmark with a stub backend')
+    parser.add_argument('--clips', type=int, default=12, help='number of synthetic messages to send')
+    parser.add_argument('--duration', type=int, default=10, help='length of each generated clip in seconds')
+    parser.add_argument('--variants', nargs='+', default=['720p-h264', '1080p-h264', '1080p-hevc'],
+                        choices=sorted(VARIANTS), help='test clip variants, used round-robin')
+    parser.add_argument('--rate', type=float, default=0, help='messages per second (0 sends them all at once)')
+    parser.add_argument('--set', nargs='*', default=[], metavar='NAME=VALUE',
+                        help='bot config overrides, e.g. STREAMING_UPLOADS=True TRANSCODE_SLOTS=2')
+    parser.add_argument('--legacy-upload', action='store_true', help='stub only the single-request upload endpoint')
+    parser.add_argument('--workdir', help='keep generated clips and logs here instead of a temporary directory')
+    parser.add_argument('--output', help='write the results as JSON for later comparison')
+    parser.add_argument('--baseline', help='JSON results of an earlier run to compare against')
+    parser.add_argument('--verbose', action='store_true', help='show the bot log on the console')
+    args = parser.parse_args()
+
+    # Resolve paths before the benchmark changes into its working directory
+    output = os.path.abspath(args.output) if args.output else None
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+
+    result = asyncio.run(run(args))
+    print_report(result, baseline)
+    if output:
+        with open(output, 'w') as output_file:
+            json.dump(result, output_file, indent=2)
+
+if __name__ == '__main__':
+    main()
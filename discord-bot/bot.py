@@ -1,44 +1,277 @@
 import os
 import re
+import json
+import threading
+import queue
+import atexit
+import reprlib
+import contextvars
+import uuid
+import base64
 import asyncio
 import logging
 import logging.handlers
-import requests
 import aiohttp
+from aiohttp import web
 import time
 import discord
-import yt_dlp
+import importlib
 import subprocess
 import shutil
-from datetime import datetime
+import sqlite3
+import socket
+import hashlib
+import urllib.parse
+import heapq
+import itertools
+import glob
+import contextlib
+import functools
+import collections
+import bisect
+import config
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
 from discord.ext import commands, tasks
+try:
+    import socketio
+except ImportError:
+    socketio = None
+
+class LazyModule:
+    """Stand-in for a heavy module that is imported on first attribute access, so startup never waits on it
+    and processes that never use it (transcode workers, for yt-dlp) never load it"""
+
+    def __init__(self, name):
+        self.name = name
+        self.module = None
+
+    def load(self):
+        # The import lock makes this safe from the download threads
+        if self.module is None:
+            self.module = importlib.import_module(self.name)
+        return self.module
+
+    def __getattr__(self, attribute):
+        return getattr(self.load(), attribute)
+
+yt_dlp = LazyModule('yt_dlp')
 from config import UPLOADBOT_USERNAME, UPLOADBOT_PASSWORD, BACKEND_URL as CONFIG_BACKEND_URL, DISCORD_BOT_TOKEN as CONFIG_BOT_TOKEN, CLIP_CHANNEL_ID as CONFIG_CHANNEL_IDS
 
 BACKEND_URL = CONFIG_BACKEND_URL
-BACKEND_TOKEN = None
 BOT_CONFIG = {}
-CLIP_CHANNEL_IDS = CONFIG_CHANNEL_IDS if isinstance(CONFIG_CHANNEL_IDS, list) else [CONFIG_CHANNEL_IDS] if CONFIG_CHANNEL_IDS else []
+CLIP_CHANNEL_IDS = set(CONFIG_CHANNEL_IDS if isinstance(CONFIG_CHANNEL_IDS, list) else [CONFIG_CHANNEL_IDS] if CONFIG_CHANNEL_IDS else [])
 DISCORD_BOT_TOKEN = CONFIG_BOT_TOKEN
 
-# Blacklist storage
-BLACKLISTED_SUBMITTER_IDS = []
-BLACKLISTED_STREAMERS = []
+# Blacklist storage; these sets are updated in place as the admin config changes
+BLACKLISTED_SUBMITTER_IDS = set()
+BLACKLISTED_STREAMERS = set()
+
+# Config changes are pushed over the backend's Socket.IO channel; the admin config is
+# only polled (as a cheap conditional GET) while that channel is down
+CONFIG_PUSH_UPDATES = getattr(config, 'CONFIG_PUSH_UPDATES', True)
+CONFIG_POLL_INTERVAL = getattr(config, 'CONFIG_POLL_INTERVAL', 60)  # seconds
+ADMIN_CONFIG_ETAG = None
+
+# Backend connection pool shared by login, config fetches and uploads
+BACKEND_POOL_SIZE = getattr(config, 'BACKEND_POOL_SIZE', 10)
+BACKEND_KEEPALIVE_TIMEOUT = getattr(config, 'BACKEND_KEEPALIVE_TIMEOUT', 60)  # seconds
+
+# Backend tokens are refreshed this many seconds before their JWT expiry; tokens without
+# an expiry are treated as valid for TOKEN_FALLBACK_LIFETIME seconds
+TOKEN_REFRESH_MARGIN = getattr(config, 'TOKEN_REFRESH_MARGIN', 5 * 60)
+TOKEN_FALLBACK_LIFETIME = 60 * 60
+# The backend answers 403 for expired tokens, so both statuses trigger a refresh and replay
+AUTH_FAILURE_STATUSES = (401, 403)
+
+# Transcode slots: auto-sized from the CPU count unless set here or via the admin config
+TRANSCODE_SLOTS = getattr(config, 'TRANSCODE_SLOTS', None)
+TRANSCODE_THREADS_PER_JOB = getattr(config, 'TRANSCODE_THREADS_PER_JOB', 4)  # used to auto-size the slots
+
+# Download stage: messages are queued for a pool of download workers, which hand
+# finished files to the clip queue (initialized in on_ready)
+DOWNLOAD_CONCURRENCY = getattr(config, 'DOWNLOAD_CONCURRENCY', 3)
+DOWNLOAD_QUEUE = None
+CLIP_QUEUE = None
+DOWNLOAD_EXECUTOR = None
+PIPELINE_TASKS = set()
+
+# Pre-flight limits checked against clip metadata before anything is downloaded
+MAX_CLIP_DURATION = getattr(config, 'MAX_CLIP_DURATION', 600)  # seconds
+MAX_CLIP_FILESIZE_MB = getattr(config, 'MAX_CLIP_FILESIZE_MB', 500)
+MIN_CLIP_HEIGHT = getattr(config, 'MIN_CLIP_HEIGHT', 720)  # quality floor for format selection
+
+# Dedup index: clips already seen (by source id or attachment hash) are skipped for this long
+DEDUP_TTL_HOURS = getattr(config, 'DEDUP_TTL_HOURS', 7 * 24)
+DEDUP = None
+
+# Transcode policy: ffprobe results decide between a remux, a fast re-encode and a full re-encode
+REMUX_CODECS = ('h264',)
+REMUX_AUDIO_CODECS = ('aac', 'mp3')
+REMUX_MAX_BITRATE_KBPS = getattr(config, 'REMUX_MAX_BITRATE_KBPS', 8000)
+REMUX_MAX_HEIGHT = getattr(config, 'REMUX_MAX_HEIGHT', 1080)
+REMUX_MAX_FILESIZE_MB = getattr(config, 'REMUX_MAX_FILESIZE_MB', 100)
+FAST_ENCODE_MAX_FILESIZE_MB = getattr(config, 'FAST_ENCODE_MAX_FILESIZE_MB', 250)
+FAST_ENCODE_PRESET = getattr(config, 'FAST_ENCODE_PRESET', 'veryfast')
+
+# Watchdog deadlines scale with the clip duration (MAX_CLIP_DURATION when unknown). FFmpeg is also
+# killed when its -progress output stops advancing, yt-dlp when no bytes arrive for the stall timeout.
+# Transcodes that overrun are retried, and dead-lettered after WATCHDOG_MAX_ATTEMPTS overruns
+FFMPEG_MIN_DEADLINE = getattr(config, 'FFMPEG_MIN_DEADLINE', 120)  # seconds
+FFMPEG_SECONDS_PER_CLIP_SECOND = getattr(config, 'FFMPEG_SECONDS_PER_CLIP_SECOND', 5)
+FFMPEG_STALL_TIMEOUT = getattr(config, 'FFMPEG_STALL_TIMEOUT', 60)  # seconds
+FFMPEG_PROGRESS_LOG_INTERVAL = 15  # seconds
+FFPROBE_TIMEOUT = 30  # seconds
+YTDLP_PROBE_TIMEOUT = getattr(config, 'YTDLP_PROBE_TIMEOUT', 60)  # seconds
+YTDLP_MIN_DEADLINE = getattr(config, 'YTDLP_MIN_DEADLINE', 120)  # seconds
+YTDLP_SECONDS_PER_CLIP_SECOND = getattr(config, 'YTDLP_SECONDS_PER_CLIP_SECOND', 2)
+YTDLP_STALL_TIMEOUT = getattr(config, 'YTDLP_STALL_TIMEOUT', 60)  # seconds
+YTDLP_SOCKET_TIMEOUT = 30  # seconds
+WATCHDOG_MAX_ATTEMPTS = getattr(config, 'WATCHDOG_MAX_ATTEMPTS', 2)
+
+# Streaming mode pipes FFmpeg's fragmented MP4 output straight into the upload instead of writing
+# a temp file; full re-encodes keep the file-based path so a failed upload does not redo them
+STREAMING_UPLOADS = getattr(config, 'STREAMING_UPLOADS', False)
+STREAMING_POLICIES = ('remux', 'fast')
+STREAMING_CHUNK_SIZE = 256 * 1024
+STREAMING_READ_TIMEOUT = 120  # seconds without a response once the body is sent
+
+# The poster image and optional preview are written by the same FFmpeg run as the clip and uploaded
+# with it, so the backend never decodes the clip again to thumbnail it
+POSTER_FORMAT = getattr(config, 'POSTER_FORMAT', 'webp')  # 'webp', 'jpg', or None to leave it to the backend
+POSTER_WIDTH = 640
+PREVIEW_SECONDS = getattr(config, 'PREVIEW_SECONDS', 0)  # length of the low-res preview, 0 disables it
+PREVIEW_WIDTH = 320
+ARTIFACT_CONTENT_TYPES = {'.webp': 'image/webp', '.jpg': 'image/jpeg', '.mp4': 'video/mp4'}
 
-# Semaphore to limit concurrent clip processing (will be initialized in main)
-CLIP_PROCESSING_SEMAPHORE = None
+# Resumable uploads: clips are sent in chunks, and a chunk only fails when it stalls or drops below
+# the minimum throughput, after which the upload resumes from the backend's acknowledged offset
+UPLOAD_CHUNK_SIZE = getattr(config, 'UPLOAD_CHUNK_SIZE', 8 * 1024 * 1024)
+UPLOAD_STALL_TIMEOUT = getattr(config, 'UPLOAD_STALL_TIMEOUT', 30)  # seconds
+UPLOAD_MIN_THROUGHPUT = getattr(config, 'UPLOAD_MIN_THROUGHPUT', 64 * 1024)  # bytes per second
+UPLOAD_MAX_STALLS = getattr(config, 'UPLOAD_MAX_STALLS', 5)
+UPLOAD_FINALIZE_TIMEOUT = 10 * 60  # the backend compresses and thumbnails the clip before answering
+
+# Durable job queue (initialized in on_ready); clips waiting for a retry live in downloads/pending/
+JOB_DB_PATH = getattr(config, 'JOB_DB_PATH', 'downloads/jobs.db')
+JOB_MAX_ATTEMPTS = getattr(config, 'JOB_MAX_ATTEMPTS', 10)
+JOB_RETRY_BASE_DELAY = getattr(config, 'JOB_RETRY_BASE_DELAY', 30)  # seconds, doubled after every failed attempt
+JOB_RETRY_MAX_DELAY = 60 * 60
+PENDING_DIR = os.path.join('downloads', 'pending')
+# Disk budget for downloads/: each clip job reserves room for its source plus the transcode output
+# before downloading, and downloads wait while the reservations would exceed the budget (0 disables it)
+DISK_BUDGET_MB = getattr(config, 'DISK_BUDGET_MB', 10 * 1024)
+DISK_TRANSCODE_HEADROOM = 2  # source plus transcoded copy
+DISK_UNKNOWN_CLIP_SIZE = 200 * 1024 * 1024  # reserved when neither yt-dlp nor MAX_CLIP_FILESIZE_MB gives a size
+
+# Shared bandwidth budget for yt-dlp downloads, attachment saves and uploads, split evenly across the
+# transfers in flight; clip hosts get their own caps so parallel downloads don't trip their throttling
+BANDWIDTH_LIMIT_MB_PER_SECOND = getattr(config, 'BANDWIDTH_LIMIT_MB_PER_SECOND', 40)  # 0 disables the budget
+HOST_BANDWIDTH_CAPS_MB_PER_SECOND = getattr(config, 'HOST_BANDWIDTH_CAPS_MB_PER_SECOND', {
+    'twitch.tv': 10,
+    'youtube.com': 10,
+    'medal.tv': 5,
+})
+HOST_ALIASES = {'youtu.be': 'youtube.com'}
+BANDWIDTH_CHUNK_SIZE = 256 * 1024  # granularity of paced uploads and attachment saves
+JOB_QUEUE = None
+ACTIVE_JOB_IDS = set()
+JOBS_WAITING = 0  # refreshed by the drain and status tasks for the metrics endpoint
+DISK_USED_BYTES = 0  # refreshed by measure_disk_task for the metrics endpoint
+DISK_FREE_BYTES = 0
+# Every call into the shared job database runs on this one thread, so a lock held by another
+# process makes a database call wait instead of the event loop
+DB_EXECUTOR = ThreadPoolExecutor(max_workers=1, thread_name_prefix='jobdb')
+
+# Catch-up after downtime: messages posted since each channel's checkpoint are replayed on startup,
+# behind live messages, at most BACKFILL_RATE_PER_MINUTE and no older than BACKFILL_MAX_AGE_HOURS.
+# Priorities order the job queue and transcode slots; live clips use 0 and lower values go first
+BACKFILL_ENABLED = getattr(config, 'BACKFILL_ENABLED', True)
+BACKFILL_RATE_PER_MINUTE = getattr(config, 'BACKFILL_RATE_PER_MINUTE', 6)
+BACKFILL_MAX_AGE_HOURS = getattr(config, 'BACKFILL_MAX_AGE_HOURS', 72)
+BACKFILL_PRIORITY = getattr(config, 'BACKFILL_PRIORITY', 1)
+LIVE_PRIORITY = 0
+CHECKPOINTS = None
+BACKFILL_TASK = None
+CATCH_UP_CHECKPOINTS = None  # checkpoints the next catch-up starts from, taken before the gap is touched
+PENDING_MESSAGES = None
+
+# Process roles sharing one job database: 'all' does everything in one process, 'ingest' only
+# listens to Discord, downloads, validates and enqueues clips, and any number of 'worker' processes
+# transcode and upload them. BOT_MODE can also be set in the environment to reuse one config.py
+BOT_MODE = os.environ.get('BOT_MODE') or getattr(config, 'BOT_MODE', 'all')
+WORKER_ID = f'{socket.gethostname()}-{os.getpid()}'
+JOB_LEASE_SECONDS = getattr(config, 'JOB_LEASE_SECONDS', 300)  # a crashed worker's jobs are taken over after this
+WORKER_POLL_INTERVAL = getattr(config, 'WORKER_POLL_INTERVAL', 5)  # seconds
+
+# Pipeline metrics, served in Prometheus text format on a local port (0 disables the endpoint)
+# and summarised in the log every METRICS_SUMMARY_INTERVAL minutes
+METRICS_HOST = getattr(config, 'METRICS_HOST', '127.0.0.1')
+METRICS_PORT = getattr(config, 'METRICS_PORT', 9108)
+METRICS_SUMMARY_INTERVAL = getattr(config, 'METRICS_SUMMARY_INTERVAL', 15)  # minutes
+METRICS_SERVER = None
+
+# The metrics port also serves /health (liveness) and /ready (readiness) for the container orchestrator;
+# the bot counts as dead once the Discord gateway has been down for HEALTH_GATEWAY_GRACE seconds
+HEALTH_GATEWAY_GRACE = getattr(config, 'HEALTH_GATEWAY_GRACE', 300)  # seconds
+GATEWAY_DOWN_SINCE = time.monotonic()  # None while the gateway session is up
+FFMPEG_STATUS = 'unchecked'
 
 # Ensure logs directory exists
 os.makedirs("logs", exist_ok=True)
 
-# Configure logging with daily rotation and better formatting
+# Records are handed to a queue on the calling thread and written by a listener thread, so file I/O never
+# runs on the event loop; logs/ gets one JSON object per line, tagged with the clip it belongs to
+LOG_LEVEL = getattr(config, 'LOG_LEVEL', 'INFO')
+LOG_MAX_MESSAGE_CHARS = getattr(config, 'LOG_MAX_MESSAGE_CHARS', 2000)
+LOG_PAYLOAD_CHARS = 500  # size of payloads such as yt-dlp metadata or response bodies in log records
+CLIP_CONTEXT = contextvars.ContextVar('clip_id', default=None)
+
+class ClipContextFilter(logging.Filter):
+    """Stamp records with the correlation id of the clip the current task is working on"""
+
+    def filter(self, record):
+        record.clip_id = CLIP_CONTEXT.get()
+        return True
+
+class JsonFormatter(logging.Formatter):
+    """One compact JSON object per record; overlong messages are cut at LOG_MAX_MESSAGE_CHARS"""
+
+    def format(self, record):
+        message = record.getMessage()
+        if len(message) > LOG_MAX_MESSAGE_CHARS:
+            message = f'{message[:LOG_MAX_MESSAGE_CHARS]}… ({len(message)} chars)'
+        entry = {
+            'ts': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'func': record.funcName,
+            'msg': message,
+        }
+        if getattr(record, 'clip_id', None):
+            entry['clip'] = record.clip_id
+        return json.dumps(entry, ensure_ascii=False)
+
+PAYLOAD_REPR = reprlib.Repr()
+PAYLOAD_REPR.maxlevel = 2
+PAYLOAD_REPR.maxdict = PAYLOAD_REPR.maxlist = 16
+PAYLOAD_REPR.maxstring = PAYLOAD_REPR.maxother = 80
+
+class Payload:
+    """Log argument for a large value; rendered only if the record is emitted, and then only partially"""
+
+    def __init__(self, value):
+        self.value = value
+
+    def __str__(self):
+        text = self.value if isinstance(self.value, str) else PAYLOAD_REPR.repr(self.value)
+        if len(text) > LOG_PAYLOAD_CHARS:
+            return f'{text[:LOG_PAYLOAD_CHARS]}… ({len(text)} chars)'
+        return text
+
 logger = logging.getLogger()
-logger.setLevel(logging.INFO)
+logger.setLevel(LOG_LEVEL)
 
-# Create formatters
-detailed_formatter = logging.Formatter(
-    '%(asctime)s | %(levelname)-8s | %(funcName)-20s | %(message)s',
-    datefmt='%Y-%m-%d %H:%M:%S'
-)
 console_formatter = logging.Formatter(
     '%(asctime)s | %(levelname)-5s | %(message)s',
     datefmt='%H:%M:%S'
@@ -46,63 +279,343 @@ console_formatter = logging.Formatter(
 
 # File handler with daily rotation
 file_handler = logging.handlers.TimedRotatingFileHandler(
-    'logs/bot.log',
+    'logs/bot.log' if BOT_MODE != 'worker' else f'logs/worker-{socket.gethostname()}.log',
     when='midnight',
     interval=1,
     backupCount=30,  # Keep 30 days of logs
     encoding='utf-8'
 )
 file_handler.setLevel(logging.DEBUG)
-file_handler.setFormatter(detailed_formatter)
+file_handler.setFormatter(JsonFormatter())
 
 # Console handler
 console_handler = logging.StreamHandler()
 console_handler.setLevel(logging.INFO)
 console_handler.setFormatter(console_formatter)
 
-# Add handlers to logger
-logger.addHandler(file_handler)
-logger.addHandler(console_handler)
+LOG_QUEUE = queue.SimpleQueue()
+queue_handler = logging.handlers.QueueHandler(LOG_QUEUE)
+queue_handler.addFilter(ClipContextFilter())
+logger.addHandler(queue_handler)
+LOG_LISTENER = logging.handlers.QueueListener(LOG_QUEUE, file_handler, console_handler, respect_handler_level=True)
+LOG_LISTENER.start()
+atexit.register(LOG_LISTENER.stop)
 
 # Reduce Discord library logging noise
 logging.getLogger('discord').setLevel(logging.WARNING)
 logging.getLogger('discord.gateway').setLevel(logging.WARNING)
 logging.getLogger('discord.client').setLevel(logging.WARNING)
 
-def get_backend_token():
-    global BACKEND_URL
-    if not BACKEND_URL:
-        BACKEND_URL = CONFIG_BACKEND_URL
-    
-    try:
-        logging.info(f"🔐 Authenticating with backend at {BACKEND_URL}")
-        response = requests.post(
-            f'{BACKEND_URL}/api/users/login', 
-            json={
-                'username': UPLOADBOT_USERNAME,
-                'password': UPLOADBOT_PASSWORD
+DURATION_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+RATIO_BUCKETS = (0.1, 0.25, 0.5, 0.75, 1, 1.5, 2, 4)
+
+# name -> (type, help, histogram buckets)
+METRIC_DEFINITIONS = {
+    'clip_stage_seconds': ('histogram', 'Time spent in each pipeline stage', DURATION_BUCKETS),
+    'clip_queue_wait_seconds': ('histogram', 'Time a clip waited in each queue', DURATION_BUCKETS),
+    'clip_compression_ratio': ('histogram', 'Transcoded size divided by downloaded size', RATIO_BUCKETS),
+    'transcode_slot_occupancy': ('histogram', 'Fraction of transcode slots busy when a clip is admitted', RATIO_BUCKETS),
+    'clip_bytes_total': ('counter', 'Clip bytes downloaded and uploaded', None),
+    'clip_transcodes_total': ('counter', 'Transcodes by policy', None),
+    'clip_rejections_total': ('counter', 'Clips skipped before processing, by reason', None),
+    'clip_failures_total': ('counter', 'Failed clip attempts, by reason', None),
+    'clips_uploaded_total': ('counter', 'Clips uploaded to the backend', None),
+    'messages_backfilled_total': ('counter', 'Messages replayed from channel history after downtime', None),
+    'disk_budget_waits_total': ('counter', 'Downloads that waited for room in the disk budget', None),
+    'bandwidth_throttled_seconds_total': ('counter', 'Time transfers spent waiting for their bandwidth share', None),
+}
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus sense"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def snapshot(self):
+        return list(self.counts), self.count, self.sum
+
+    def quantile(self, q, counts):
+        """Estimate a quantile from bucket counts by interpolating inside the bucket, like histogram_quantile"""
+        total = sum(counts)
+        if not total:
+            return None
+        rank = q * total
+        seen = 0
+        for index, count in enumerate(counts):
+            if seen + count >= rank and count:
+                lower = self.buckets[index - 1] if index else 0
+                if index == len(self.buckets):
+                    return lower
+                return lower + (self.buckets[index] - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+class PipelineMetrics:
+    """In-process counters, gauges and histograms for the clip pipeline"""
+
+    def __init__(self):
+        self.histograms = {}  # (name, labels) -> Histogram
+        self.counters = collections.Counter()  # (name, labels) -> value
+        self.gauges = {}  # name -> (help, read function)
+        self.last_summary = {}  # (name, labels) -> histogram snapshot at the previous summary
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted(labels.items()))
+
+    def observe(self, name, value, **labels):
+        key = self._key(name, labels)
+        if key not in self.histograms:
+            self.histograms[key] = Histogram(METRIC_DEFINITIONS[name][2])
+        self.histograms[key].observe(value)
+
+    def inc(self, name, amount=1, **labels):
+        self.counters[self._key(name, labels)] += amount
+
+    def gauge(self, name, help_text, read):
+        """Register a gauge whose value is read at scrape time"""
+        self.gauges[name] = (help_text, read)
+
+    @contextlib.contextmanager
+    def timer(self, stage):
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe('clip_stage_seconds', time.monotonic() - started, stage=stage)
+
+    @staticmethod
+    def _labels(labels, extra=()):
+        pairs = list(labels) + list(extra)
+        if not pairs:
+            return ''
+        return '{' + ','.join(f'{key}="{value}"' for key, value in pairs) + '}'
+
+    def render(self):
+        """Prometheus text exposition of every metric"""
+        lines = []
+        for name, (kind, help_text, _) in METRIC_DEFINITIONS.items():
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            if kind == 'counter':
+                for (metric, labels), value in sorted(self.counters.items()):
+                    if metric == name:
+                        lines.append(f'{name}{self._labels(labels)} {value}')
+                continue
+            for (metric, labels), histogram in sorted(self.histograms.items(), key=lambda item: item[0]):
+                if metric != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(list(histogram.buckets) + ['+Inf'], histogram.counts):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{self._labels(labels, [("le", bound)])} {cumulative}')
+                lines.append(f'{name}_sum{self._labels(labels)} {histogram.sum}')
+                lines.append(f'{name}_count{self._labels(labels)} {histogram.count}')
+        for name, (help_text, read) in self.gauges.items():
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} gauge')
+            lines.append(f'{name} {read()}')
+        return '\n'.join(lines) + '\n'
+
+    def summary(self):
+        """One line per stage and queue with count, p50 and p95 since the previous summary"""
+        lines = []
+        for (name, labels), histogram in sorted(self.histograms.items(), key=lambda item: item[0]):
+            counts, count, total = histogram.snapshot()
+            previous_counts, previous_count, previous_total = self.last_summary.get(
+                (name, labels), ([0] * len(counts), 0, 0.0))
+            self.last_summary[(name, labels)] = (counts, count, total)
+            delta = [now - before for now, before in zip(counts, previous_counts)]
+            if count == previous_count:
+                continue
+            label_text = ','.join(str(value) for _, value in labels)
+            lines.append(f"{name}[{label_text}]: n={count - previous_count} "
+                         f"avg={(total - previous_total) / (count - previous_count):.2f} "
+                         f"p50={histogram.quantile(0.5, delta):.2f} p95={histogram.quantile(0.95, delta):.2f}")
+        for (name, labels), value in sorted(self.counters.items()):
+            label_text = ','.join(str(value) for _, value in labels)
+            lines.append(f"{name}[{label_text}]: {value}")
+        for name, (_, read) in self.gauges.items():
+            lines.append(f"{name}: {read()}")
+        return lines
+
+METRICS = PipelineMetrics()
+
+class BackendClient:
+    """Long-lived async client for the ClipSesh backend that reuses pooled keep-alive connections"""
+
+    def __init__(self, base_url):
+        self.base_url = base_url
+        self._session = None
+
+    @property
+    def session(self):
+        # Created lazily so the session binds to the running event loop
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=BACKEND_POOL_SIZE, keepalive_timeout=BACKEND_KEEPALIVE_TIMEOUT)
+            self._session = aiohttp.ClientSession(connector=connector)
+        return self._session
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+    async def login(self, username, password):
+        """Log in and return a backend token"""
+        async with self.session.post(
+            f'{self.base_url}/api/users/login',
+            json={'username': username, 'password': password},
+            timeout=aiohttp.ClientTimeout(total=10)
+        ) as response:
+            if response.status == 400:
+                text = await response.text()
+                logging.error(f"❌ Authentication failed - Invalid credentials (400): {text}")
+                raise ValueError(f"Authentication failed with 400 error: {text}")
+            elif response.status == 502:
+                logging.error("❌ Backend server unavailable (502 Bad Gateway)")
+                raise ConnectionError("Backend API is currently unavailable (502)")
+            
+            response.raise_for_status()
+            
+            data = await response.json()
+            if 'token' not in data:
+                logging.error(f"❌ No token in response: {data}")
+                raise ValueError("Backend API did not return a token")
+            return data['token']
+
+    async def get_admin_config(self, token, etag=None):
+        """Fetch the admin config, or get a 304 if it still matches etag; the returned response has its body already read"""
+        headers = {'Authorization': f'Bearer {token}'}
+        if etag:
+            headers['If-None-Match'] = etag
+        async with self.session.get(
+            f'{self.base_url}/api/config/admin',
+            headers=headers,
+            timeout=aiohttp.ClientTimeout(total=10)
+        ) as response:
+            await response.read()
+            return response
+
+    async def upload_clip(self, token, filename, fields, artifacts=None, transfer=None):
+        """POST a clip file with its metadata fields and artifacts; the returned response has its body already read"""
+        with contextlib.ExitStack() as files:
+            data = aiohttp.FormData()
+            clip = paced_file(filename, transfer) if transfer else files.enter_context(open(filename, 'rb'))
+            data.add_field('clip', clip, filename=os.path.basename(filename))
+            for name, value in fields.items():
+                data.add_field(name, value)
+            for name, path in (artifacts or {}).items():
+                data.add_field(name, files.enter_context(open(path, 'rb')), filename=os.path.basename(path),
+                               content_type=artifact_content_type(path))
+            
+            async with self.session.post(
+                f'{self.base_url}/api/clips',
+                data=data,
+                headers={'Authorization': f'Bearer {token}'},
+                timeout=aiohttp.ClientTimeout(total=None, sock_connect=10, sock_read=UPLOAD_FINALIZE_TIMEOUT)
+            ) as response:
+                await response.read()
+                return response
+
+    async def start_upload(self, token, name, size):
+        """Open a resumable upload session"""
+        async with self.session.post(
+            f'{self.base_url}/api/clips/uploads',
+            json={'filename': name, 'size': size},
+            headers={'Authorization': f'Bearer {token}'},
+            timeout=aiohttp.ClientTimeout(total=10)
+        ) as response:
+            await response.read()
+            return response
+
+    async def get_upload(self, token, upload_id):
+        """Ask the backend how many bytes of a resumable upload it has stored"""
+        async with self.session.get(
+            f'{self.base_url}/api/clips/uploads/{upload_id}',
+            headers={'Authorization': f'Bearer {token}'},
+            timeout=aiohttp.ClientTimeout(total=10)
+        ) as response:
+            await response.read()
+            return response
+
+    async def put_upload_chunk(self, token, upload_id, offset, chunk, transfer=None):
+        """Append one chunk at `offset`; the caller bounds the whole call by a throughput deadline"""
+        async with self.session.put(
+            f'{self.base_url}/api/clips/uploads/{upload_id}',
+            data=paced_bytes(chunk, transfer) if transfer else chunk,
+            headers={
+                'Authorization': f'Bearer {token}',
+                'Content-Type': 'application/octet-stream',
+                'Upload-Offset': str(offset),
             },
-            timeout=10
-        )
-        
-        if response.status_code == 400:
-            logging.error(f"❌ Authentication failed - Invalid credentials (400): {response.text}")
-            raise ValueError(f"Authentication failed with 400 error: {response.text}")
-        elif response.status_code == 502:
-            logging.error("❌ Backend server unavailable (502 Bad Gateway)")
-            raise ConnectionError("Backend API is currently unavailable (502)")
-        
-        response.raise_for_status()
+            timeout=aiohttp.ClientTimeout(total=None, sock_connect=10, sock_read=UPLOAD_STALL_TIMEOUT)
+        ) as response:
+            await response.read()
+            return response
+
+    async def complete_upload(self, token, upload_id, fields, artifacts=None):
+        """Finish a resumable upload; artifacts are sent along as multipart files"""
+        with contextlib.ExitStack() as files:
+            if artifacts:
+                body = {'data': aiohttp.FormData(fields)}
+                for name, path in artifacts.items():
+                    body['data'].add_field(name, files.enter_context(open(path, 'rb')), filename=os.path.basename(path),
+                                           content_type=artifact_content_type(path))
+            else:
+                body = {'json': fields}
+            async with self.session.post(
+                f'{self.base_url}/api/clips/uploads/{upload_id}/complete',
+                **body,
+                headers={'Authorization': f'Bearer {token}'},
+                timeout=aiohttp.ClientTimeout(total=None, sock_connect=10, sock_read=UPLOAD_FINALIZE_TIMEOUT)
+            ) as response:
+                await response.read()
+                return response
+
+    async def upload_clip_stream(self, token, name, chunks, fields, artifacts=None, transfer=None):
+        """POST a clip whose bytes come from an async iterator, using a chunked request body.
+
+        Artifacts follow the clip in the body, so they are only read once the clip has been sent.
+        """
+        data = aiohttp.FormData()
+        for field_name, value in fields.items():
+            data.add_field(field_name, value)
+        data.add_field('clip', paced_chunks(chunks, transfer) if transfer else chunks, filename=name, content_type='video/mp4')
+        for field_name, path in (artifacts or {}).items():
+            data.add_field(field_name, read_artifact(path), filename=os.path.basename(path),
+                           content_type=artifact_content_type(path))
         
-        data = response.json()
-        if 'token' not in data:
-            logging.error(f"❌ No token in response: {data}")
-            raise ValueError("Backend API did not return a token")
-            
+        async with self.session.post(
+            f'{self.base_url}/api/clips',
+            data=data,
+            headers={'Authorization': f'Bearer {token}'},
+            # No total limit: the body is produced as fast as FFmpeg encodes
+            timeout=aiohttp.ClientTimeout(total=None, sock_read=STREAMING_READ_TIMEOUT)
+        ) as response:
+            await response.read()
+            return response
+
+BACKEND = BackendClient(BACKEND_URL)
+
+async def get_backend_token():
+    if not BACKEND.base_url:
+        BACKEND.base_url = CONFIG_BACKEND_URL
+    
+    try:
+        logging.info(f"🔐 Authenticating with backend at {BACKEND.base_url}")
+        token = await BACKEND.login(UPLOADBOT_USERNAME, UPLOADBOT_PASSWORD)
         logging.info("✅ Successfully authenticated with backend")
-        return data['token']
+        return token
         
-    except requests.exceptions.RequestException as e:
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
         logging.error(f"🌐 Network error while getting token: {str(e)}")
         raise
     except (ValueError, KeyError) as e:
@@ -112,65 +625,1099 @@ def get_backend_token():
         logging.error(f"💥 Unexpected error while getting token: {str(e)}")
         raise
 
-async def process_clip(filename, streamer, title, link, submitter, discord_submitter_id):
-    """Process a clip asynchronously with compression and upload"""
-    # Ensure semaphore is initialized
-    if CLIP_PROCESSING_SEMAPHORE is None:
-        logging.warning("Semaphore not initialized, processing without limit")
-        await _process_clip_internal(filename, streamer, title, link, submitter, discord_submitter_id)
+def jwt_expiry(token):
+    """Expiry timestamp from a JWT payload, or None if it cannot be read"""
+    try:
+        payload = token.split('.')[1]
+        payload += '=' * (-len(payload) % 4)
+        return float(json.loads(base64.urlsafe_b64decode(payload))['exp'])
+    except (AttributeError, IndexError, KeyError, TypeError, ValueError):
+        return None
+
+class TokenManager:
+    """Holds the backend token, refreshes it shortly before it expires and shares one in-flight refresh between callers"""
+
+    def __init__(self):
+        self.token = None
+        self.expires_at = None
+        self._refresh_task = None
+
+    def needs_refresh(self):
+        return not self.token or time.time() >= self.expires_at - TOKEN_REFRESH_MARGIN
+
+    async def get(self):
+        """Current token, refreshed first if it is missing or about to expire"""
+        if self.needs_refresh():
+            return await self.refresh()
+        return self.token
+
+    async def refresh(self, stale_token=None):
+        """Refresh the token; callers that saw stale_token get an already refreshed token without another login"""
+        if stale_token is not None and self.token and self.token != stale_token:
+            return self.token
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.ensure_future(self._refresh())
+        return await asyncio.shield(self._refresh_task)
+
+    async def _refresh(self):
+        token = await get_backend_token()
+        self.token = token
+        self.expires_at = jwt_expiry(token) or time.time() + TOKEN_FALLBACK_LIFETIME
+        logging.info(f"🔑 Backend token valid until {datetime.fromtimestamp(self.expires_at):%Y-%m-%d %H:%M:%S}")
+        return token
+
+TOKENS = TokenManager()
+
+async def call_with_token(request):
+    """Run request(token) and, if the backend rejects the token, refresh it once and replay the request"""
+    token = await TOKENS.get()
+    response = await request(token)
+    if response.status in AUTH_FAILURE_STATUSES:
+        logging.warning(f"🔑 Backend rejected the token ({response.status}), refreshing and replaying the request")
+        token = await TOKENS.refresh(stale_token=token)
+        response = await request(token)
+    return response
+
+class OffLoop:
+    """Async front for a SQLite-backed object: each method call is awaited and runs on DB_EXECUTOR"""
+
+    def __init__(self, target):
+        self.target = target
+
+    def __getattr__(self, name):
+        method = getattr(self.target, name)
+
+        async def call(*args, **kwargs):
+            return await asyncio.get_running_loop().run_in_executor(DB_EXECUTOR, functools.partial(method, *args, **kwargs))
+        return call
+
+class JobQueue:
+    """Durable SQLite record of every clip job so unfinished work survives failures and restarts"""
+
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        # Ingest and worker processes share the file; WAL lets them read while one of them writes
+        self.db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('''
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                filename TEXT NOT NULL,
+                streamer TEXT,
+                title TEXT,
+                link TEXT,
+                submitter TEXT,
+                discord_submitter_id TEXT,
+                stage TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at REAL NOT NULL DEFAULT 0,
+                last_error TEXT,
+                upload_id TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        ''')
+        self.db.execute('CREATE INDEX IF NOT EXISTS jobs_stage ON jobs (stage, next_attempt_at)')
+        self._add_missing_column('upload_id', 'TEXT')
+        self._add_missing_column('claimed_by', 'TEXT')
+        self._add_missing_column('claimed_until', 'REAL')
+        self._add_missing_column('priority', 'INTEGER NOT NULL DEFAULT 0')
+        self._add_missing_column('clip_id', 'TEXT')
+        self._add_missing_column('overruns', 'INTEGER NOT NULL DEFAULT 0')
+        self.db.commit()
+
+    def _add_missing_column(self, name, definition):
+        """Upgrade job databases created by older versions of the bot"""
+        columns = {row['name'] for row in self.db.execute('PRAGMA table_info(jobs)')}
+        if name not in columns:
+            self.db.execute(f'ALTER TABLE jobs ADD COLUMN {name} {definition}')
+
+    def add(self, job, claimed_by=None):
+        """Record a freshly downloaded clip and return its job id; claimed_by keeps it for this process"""
+        now = time.time()
+        cursor = self.db.execute(
+            '''INSERT INTO jobs (filename, streamer, title, link, submitter, discord_submitter_id, stage, priority,
+                                 clip_id, claimed_by, claimed_until, created_at, updated_at)
+               VALUES (?, ?, ?, ?, ?, ?, 'downloaded', ?, ?, ?, ?, ?, ?)''',
+            (job['filename'], job['streamer'], job['title'], job['link'], job['submitter'],
+             str(job['discord_submitter_id']), job.get('priority', LIVE_PRIORITY), job.get('clip_id'),
+             claimed_by, now + JOB_LEASE_SECONDS if claimed_by else None, now, now)
+        )
+        self.db.commit()
+        return cursor.lastrowid
+
+    def set_stage(self, job_id, stage, filename=None):
+        self.db.execute(
+            'UPDATE jobs SET stage = ?, filename = COALESCE(?, filename), updated_at = ? WHERE id = ?',
+            (stage, filename, time.time(), job_id)
+        )
+        self.db.commit()
+
+    def set_upload_id(self, job_id, upload_id):
+        self.db.execute('UPDATE jobs SET upload_id = ?, updated_at = ? WHERE id = ?', (upload_id, time.time(), job_id))
+        self.db.commit()
+
+    def record_failure(self, job_id, error):
+        """Count a failed attempt and schedule the next one with exponential backoff; returns False once the job is dead"""
+        row = self.db.execute('SELECT attempts FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        attempts = (row['attempts'] if row else 0) + 1
+        if attempts >= JOB_MAX_ATTEMPTS:
+            self.db.execute(
+                "UPDATE jobs SET stage = 'failed', attempts = ?, last_error = ?, updated_at = ? WHERE id = ?",
+                (attempts, error, time.time(), job_id)
+            )
+            self.db.commit()
+            return False
+        delay = min(JOB_RETRY_BASE_DELAY * 2 ** (attempts - 1), JOB_RETRY_MAX_DELAY)
+        self.db.execute(
+            'UPDATE jobs SET attempts = ?, next_attempt_at = ?, last_error = ?, updated_at = ? WHERE id = ?',
+            (attempts, time.time() + delay, error, time.time(), job_id)
+        )
+        self.db.commit()
+        return True
+
+    def record_overrun(self, job_id):
+        """Count a transcode the watchdog killed; returns how many times that has happened to the job"""
+        self.db.execute('UPDATE jobs SET overruns = overruns + 1 WHERE id = ?', (job_id,))
+        self.db.commit()
+        return self.db.execute('SELECT overruns FROM jobs WHERE id = ?', (job_id,)).fetchone()['overruns']
+
+    def mark_failed(self, job_id, error):
+        self.db.execute(
+            "UPDATE jobs SET stage = 'failed', last_error = ?, updated_at = ? WHERE id = ?",
+            (error, time.time(), job_id)
+        )
+        self.db.commit()
+
+    def claim_due(self, worker_id, limit, exclude=()):
+        """Lease up to `limit` unfinished jobs whose backoff has elapsed, by priority and then oldest first.
+
+        Jobs leased by another process are skipped until that lease runs out, so the jobs of a
+        crashed worker are picked up again. Leases already held under worker_id (a restarted
+        container keeps its id) are taken back right away, except for the job ids in exclude.
+        """
+        now = time.time()
+        exclude = list(exclude)
+        # IMMEDIATE takes the write lock up front so two workers never lease the same job
+        self.db.execute('BEGIN IMMEDIATE')
+        try:
+            rows = self.db.execute(
+                f"""SELECT * FROM jobs WHERE stage IN ('downloaded', 'transcoded') AND next_attempt_at <= ?
+                    AND (claimed_until IS NULL OR claimed_until < ? OR claimed_by = ?)
+                    AND id NOT IN ({','.join('?' * len(exclude))}) ORDER BY priority, id LIMIT ?""",
+                (now, now, worker_id, *exclude, limit)
+            ).fetchall()
+            self.db.executemany(
+                'UPDATE jobs SET claimed_by = ?, claimed_until = ? WHERE id = ?',
+                [(worker_id, now + JOB_LEASE_SECONDS, row['id']) for row in rows]
+            )
+            self.db.commit()
+        except BaseException:
+            self.db.rollback()
+            raise
+        return [job_from_row(row) for row in rows]
+
+    def renew_leases(self, worker_id, job_ids):
+        self.db.executemany(
+            'UPDATE jobs SET claimed_until = ? WHERE id = ? AND claimed_by = ?',
+            [(time.time() + JOB_LEASE_SECONDS, job_id, worker_id) for job_id in job_ids]
+        )
+        self.db.commit()
+
+    def release(self, job_id):
+        """End a job's lease; claimed_by is kept to report which process handled it last"""
+        self.db.execute('UPDATE jobs SET claimed_until = NULL WHERE id = ?', (job_id,))
+        self.db.commit()
+
+    def leased_elsewhere(self, worker_id):
+        """Whether another process holds (or held until it died) a lease on an unfinished job"""
+        return self.db.execute(
+            """SELECT 1 FROM jobs WHERE stage IN ('downloaded', 'transcoded') AND claimed_until IS NOT NULL
+               AND claimed_by != ? LIMIT 1""",
+            (worker_id,)
+        ).fetchone() is not None
+
+    def waiting_count(self):
+        """Unfinished jobs that are due and not leased by any process"""
+        now = time.time()
+        return self.db.execute(
+            """SELECT COUNT(*) FROM jobs WHERE stage IN ('downloaded', 'transcoded') AND next_attempt_at <= ?
+               AND (claimed_until IS NULL OR claimed_until < ?)""",
+            (now, now)
+        ).fetchone()[0]
+
+    def finished_since(self, since):
+        """Jobs that were uploaded or failed after `since`"""
+        return self.db.execute(
+            "SELECT * FROM jobs WHERE stage IN ('uploaded', 'failed') AND updated_at > ? ORDER BY updated_at",
+            (since,)
+        ).fetchall()
+
+    def tracked_files(self):
+        """Filenames of unfinished jobs by job id"""
+        rows = self.db.execute("SELECT id, filename FROM jobs WHERE stage IN ('downloaded', 'transcoded')").fetchall()
+        return {row['id']: row['filename'] for row in rows}
+
+class DedupIndex:
+    """Persistent index of clip keys (source ids and content hashes) that were already posted"""
+
+    def __init__(self, path):
+        self.db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute('''
+            CREATE TABLE IF NOT EXISTS dedup (
+                key TEXT PRIMARY KEY,
+                job_id INTEGER,
+                clip_id TEXT,
+                expires_at REAL NOT NULL
+            )
+        ''')
+        self.db.execute('CREATE INDEX IF NOT EXISTS dedup_job ON dedup (job_id)')
+        self.db.commit()
+
+    def claim(self, key):
+        """Reserve a key; returns the existing entry if it is already taken, otherwise None"""
+        now = time.time()
+        self.db.execute('DELETE FROM dedup WHERE key = ? AND expires_at < ?', (key, now))
+        cursor = self.db.execute(
+            'INSERT OR IGNORE INTO dedup (key, expires_at) VALUES (?, ?)',
+            (key, now + DEDUP_TTL_HOURS * 3600)
+        )
+        self.db.commit()
+        if cursor.rowcount:
+            return None
+        return self.db.execute('SELECT * FROM dedup WHERE key = ?', (key,)).fetchone()
+
+    def attach(self, keys, job_id):
+        self.db.executemany('UPDATE dedup SET job_id = ? WHERE key = ?', [(job_id, key) for key in keys])
+        self.db.commit()
+
+    def link(self, job_id, clip_id):
+        """Remember the backend clip a job's keys ended up as"""
+        self.db.execute('UPDATE dedup SET clip_id = ? WHERE job_id = ?', (clip_id, job_id))
+        self.db.commit()
+
+    def release(self, keys):
+        self.db.executemany('DELETE FROM dedup WHERE key = ?', [(key,) for key in keys])
+        self.db.commit()
+
+    def release_job(self, job_id):
+        """Forget a failed job's keys so the clip can be posted again"""
+        self.db.execute('DELETE FROM dedup WHERE job_id = ?', (job_id,))
+        self.db.commit()
+
+    def release_abandoned(self):
+        """Forget keys claimed by downloads that never became a job, or whose job is gone; only safe
+        while no download is running. Keys of uploaded clips are kept."""
+        cursor = self.db.execute(
+            """DELETE FROM dedup WHERE clip_id IS NULL AND (job_id IS NULL
+               OR job_id NOT IN (SELECT id FROM jobs WHERE stage != 'failed'))"""
+        )
+        self.db.commit()
+        return cursor.rowcount
+
+    def evict(self):
+        cursor = self.db.execute('DELETE FROM dedup WHERE expires_at < ?', (time.time(),))
+        self.db.commit()
+        return cursor.rowcount
+
+CLIP_ID_PATTERNS = [
+    ('twitch', re.compile(r'clips\.twitch\.tv/(?:embed\?clip=)?([\w-]+)')),
+    ('twitch', re.compile(r'twitch\.tv/[^/]+/clip/([\w-]+)')),
+    ('youtube', re.compile(r'(?:youtube\.com/(?:watch\?(?:.*&)?v=|shorts/|clip/|embed/)|youtu\.be/)([\w-]+)')),
+    ('medal', re.compile(r'medal\.tv/(?:.*/)?clips/([\w-]+)')),
+]
+
+def normalize_clip_url(url):
+    """Dedup key for a clip URL: the platform's clip id when recognised, else the bare host and path"""
+    for source, pattern in CLIP_ID_PATTERNS:
+        match = pattern.search(url)
+        if match:
+            return f'{source}:{match.group(1)}'
+    parsed = urllib.parse.urlsplit(url)
+    return f'url:{parsed.netloc.lower()}{parsed.path.rstrip("/")}'
+
+def file_sha256(filename):
+    """Content hash of a file, meant to run inside DOWNLOAD_EXECUTOR"""
+    digest = hashlib.sha256()
+    with open(filename, 'rb') as file_handle:
+        for block in iter(lambda: file_handle.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+async def claim_dedup_key(key, claimed):
+    """Claim a dedup key for the message being handled; returns False if the clip was already posted"""
+    existing = await DEDUP.claim(key)
+    if existing:
+        if existing['clip_id']:
+            logging.info(f"♻️ Skipping duplicate clip {key}: already uploaded as backend clip {existing['clip_id']}")
+        else:
+            logging.info(f"♻️ Skipping duplicate clip {key}: already being processed (job {existing['job_id']})")
+        METRICS.inc('clip_rejections_total', reason='duplicate')
+        return False
+    claimed.append(key)
+    return True
+
+class ChannelCheckpoints:
+    """Id of the last handled message per clip channel, the starting point of the next catch-up"""
+
+    def __init__(self, path):
+        self.db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.db.execute('''
+            CREATE TABLE IF NOT EXISTS channel_checkpoints (
+                channel_id INTEGER PRIMARY KEY,
+                message_id INTEGER NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        ''')
+        self.db.commit()
+
+    def all(self):
+        return dict(self.db.execute('SELECT channel_id, message_id FROM channel_checkpoints').fetchall())
+
+    def advance(self, channel_id, message_id):
+        """Move a channel's checkpoint forward; messages finishing out of order never move it back"""
+        self.db.execute(
+            '''INSERT INTO channel_checkpoints (channel_id, message_id, updated_at) VALUES (?, ?, ?)
+               ON CONFLICT (channel_id) DO UPDATE SET message_id = MAX(message_id, excluded.message_id),
+               updated_at = excluded.updated_at''',
+            (channel_id, message_id, time.time())
+        )
+        self.db.commit()
+
+class PendingMessages:
+    """Messages whose clips are still in the download pipeline, per channel.
+
+    A channel's checkpoint moves up to the newest handled message, but never past a message that still
+    has clips queued or downloading, nor past the part of the history a catch-up has not read yet, so
+    nothing that is not recorded as a job yet is skipped after a crash.
+    """
+
+    def __init__(self, checkpoints):
+        self.checkpoints = checkpoints
+        self.sources = {}  # message id -> clip sources not finished yet
+        self.by_channel = collections.defaultdict(set)  # channel id -> ids of those messages
+        self.handled = {}  # channel id -> newest handled message id
+        self.floors = {}  # channel id -> oldest message id a running catch-up has not read yet
+
+    def __contains__(self, message_id):
+        return message_id in self.sources
+
+    def add(self, message, sources):
+        self.sources[message.id] = sources
+        self.by_channel[message.channel.id].add(message.id)
+
+    async def finish(self, message):
+        """Count one clip of a message as done; the message is handled once all of them are"""
+        self.sources[message.id] -= 1
+        if not self.sources[message.id]:
+            del self.sources[message.id]
+            self.by_channel[message.channel.id].discard(message.id)
+            await self.handled_message(message.channel.id, message.id)
+
+    async def handled_message(self, channel_id, message_id):
+        self.handled[channel_id] = max(self.handled.get(channel_id, 0), message_id)
+        await self._advance(channel_id)
+
+    def hold_floor(self, channel_id, message_id):
+        """Keep the checkpoint below message_id while a catch-up has not read that far"""
+        self.floors[channel_id] = message_id
+
+    async def release_floor(self, channel_id):
+        self.floors.pop(channel_id, None)
+        await self._advance(channel_id)
+
+    async def _advance(self, channel_id):
+        if channel_id not in self.handled:
+            return
+        checkpoint = self.handled[channel_id]
+        if self.by_channel[channel_id]:
+            checkpoint = min(checkpoint, min(self.by_channel[channel_id]) - 1)
+        if channel_id in self.floors:
+            checkpoint = min(checkpoint, self.floors[channel_id] - 1)
+        await self.checkpoints.advance(channel_id, checkpoint)
+
+def job_from_row(row):
+    return {
+        'job_id': row['id'],
+        'stage': row['stage'],
+        'filename': row['filename'],
+        'streamer': row['streamer'],
+        'title': row['title'],
+        'link': row['link'],
+        'submitter': row['submitter'],
+        'discord_submitter_id': row['discord_submitter_id'],
+        'upload_id': row['upload_id'],
+        'attempts': row['attempts'],
+        'priority': row['priority'],
+        'clip_id': row['clip_id'],
+    }
+
+class DiskBudget:
+    """Bytes of downloads/ promised to clip jobs; downloads wait while a new clip would not fit.
+
+    Reservations are keyed by job id once the job exists, and cover the peak of a job (its source and the
+    transcode output) rather than what is on disk at any one moment.
+    """
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.reservations = {}
+        self.released = None  # created on first wait, inside the running event loop
+
+    @property
+    def reserved(self):
+        return sum(self.reservations.values())
+
+    def fits(self, size):
+        # A clip larger than the whole budget still runs, but only on its own
+        return not self.limit or not self.reservations or self.reserved + size <= self.limit
+
+    async def reserve(self, key, size):
+        """Wait until `size` more bytes fit in the budget and reserve them under `key`"""
+        if not self.fits(size):
+            logging.info(f"💽 Disk budget full ({self.reserved / 1024 / 1024:.0f}/{self.limit / 1024 / 1024:.0f}MB), "
+                         f"waiting to download {size / 1024 / 1024:.0f}MB")
+            METRICS.inc('disk_budget_waits_total')
+            waiting_since = time.monotonic()
+            while not self.fits(size):
+                if self.released is None or self.released.is_set():
+                    self.released = asyncio.Event()
+                await self.released.wait()
+            METRICS.observe('clip_queue_wait_seconds', time.monotonic() - waiting_since, queue='disk')
+        self.reservations[key] = size
+
+    def hold(self, key, size):
+        """Account for a clip that is already on disk; never waits"""
+        previous = self.reservations.get(key, 0)
+        self.reservations[key] = size
+        if size < previous:
+            self.wake()
+
+    def rekey(self, key, new_key, size):
+        self.reservations.pop(key, None)
+        self.hold(new_key, size)
+
+    def release(self, key):
+        if self.reservations.pop(key, None) is not None:
+            self.wake()
+
+    def wake(self):
+        if self.released:
+            self.released.set()
+
+    def settle(self, key, filename):
+        """Shrink a finished job's reservation to what it left on disk, or release it"""
+        if os.path.exists(filename):
+            self.hold(key, file_footprint(filename))
+        else:
+            self.release(key)
+
+def clip_footprint(size):
+    """Bytes to reserve for a clip of `size` bytes until its transcode has replaced the source"""
+    if not size:
+        size = MAX_CLIP_FILESIZE_MB * 1024 * 1024 if MAX_CLIP_FILESIZE_MB else DISK_UNKNOWN_CLIP_SIZE
+    return int(size * DISK_TRANSCODE_HEADROOM)
+
+def file_footprint(filename):
+    """Bytes a clip and its rendered artifacts take on disk"""
+    return sum(os.path.getsize(path) for path in [filename, *clip_artifacts(filename).values()] if os.path.exists(path))
+
+def directory_bytes(directory):
+    total = 0
+    for root, _, files in os.walk(directory):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+DISK_BUDGET = DiskBudget(int(DISK_BUDGET_MB * 1024 * 1024))
+
+class Transfer:
+    """One paced transfer: a token bucket refilled at its current share of the bandwidth budget"""
+
+    def __init__(self, manager, host):
+        self.manager = manager
+        self.host = host
+        self.tokens = BANDWIDTH_CHUNK_SIZE
+        self.updated = time.monotonic()
+        self.throttled = 0.0
+
+    def take(self, size):
+        """Take `size` bytes of tokens and return how long the caller has to wait for them"""
+        rate = self.manager.share(self.host)
+        if not rate:
+            return 0
+        now = time.monotonic()
+        self.tokens = min(BANDWIDTH_CHUNK_SIZE, self.tokens + (now - self.updated) * rate) - size
+        self.updated = now
+        if self.tokens >= 0:
+            return 0
+        delay = -self.tokens / rate
+        self.throttled += delay
+        return delay
+
+    async def consume(self, size):
+        delay = self.take(size)
+        if delay:
+            await asyncio.sleep(delay)
+
+    def consume_blocking(self, size):
+        """Pace a transfer running in a worker thread, such as a yt-dlp download"""
+        delay = self.take(size)
+        if delay:
+            time.sleep(delay)
+
+class BandwidthManager:
+    """Splits the bandwidth budget evenly across the transfers in flight, within per-host caps.
+
+    Shares are recomputed on every chunk, so a transfer speeds up as soon as another one finishes.
+    """
+
+    def __init__(self, limit, host_caps):
+        self.limit = limit
+        self.host_caps = host_caps
+        self.active = collections.Counter()  # host -> transfers in flight
+        self.lock = threading.Lock()  # yt-dlp transfers are paced from download threads
+
+    def share(self, host):
+        with self.lock:
+            rates = []
+            if self.limit:
+                rates.append(self.limit / max(1, sum(self.active.values())))
+            if host in self.host_caps:
+                rates.append(self.host_caps[host] / max(1, self.active[host]))
+        return min(rates) if rates else 0
+
+    @contextlib.contextmanager
+    def transfer(self, host):
+        transfer = Transfer(self, host)
+        with self.lock:
+            self.active[host] += 1
+        try:
+            yield transfer
+        finally:
+            with self.lock:
+                self.active[host] -= 1
+                if not self.active[host]:
+                    del self.active[host]
+            if transfer.throttled:
+                METRICS.inc('bandwidth_throttled_seconds_total', transfer.throttled, host=host)
+
+def bandwidth_host(url):
+    """The capped host a clip URL belongs to, or the URL's own host"""
+    host = (urllib.parse.urlsplit(url).hostname or '').lower()
+    for domain in [*HOST_ALIASES, *HOST_BANDWIDTH_CAPS_MB_PER_SECOND]:
+        if host == domain or host.endswith(f'.{domain}'):
+            return HOST_ALIASES.get(domain, domain)
+    return host
+
+async def paced_bytes(data, transfer):
+    for start in range(0, len(data), BANDWIDTH_CHUNK_SIZE):
+        piece = data[start:start + BANDWIDTH_CHUNK_SIZE]
+        await transfer.consume(len(piece))
+        yield piece
+
+async def paced_chunks(chunks, transfer):
+    async for chunk in chunks:
+        async for piece in paced_bytes(chunk, transfer):
+            yield piece
+
+async def paced_file(filename, transfer):
+    loop = asyncio.get_running_loop()
+    offset = 0
+    while True:
+        piece = await loop.run_in_executor(None, read_file_chunk, filename, offset, BANDWIDTH_CHUNK_SIZE)
+        if not piece:
+            break
+        offset += len(piece)
+        await transfer.consume(len(piece))
+        yield piece
+
+BANDWIDTH = BandwidthManager(
+    int(BANDWIDTH_LIMIT_MB_PER_SECOND * 1024 * 1024),
+    {host: int(cap * 1024 * 1024) for host, cap in HOST_BANDWIDTH_CAPS_MB_PER_SECOND.items() if cap}
+)
+
+async def park_for_retry(job, reason):
+    """Move a clip into downloads/pending/ and schedule a retry, or drop it once it ran out of attempts"""
+    filename = job['filename']
+    if os.path.exists(filename) and os.path.dirname(filename) != PENDING_DIR:
+        pending_path = os.path.join(PENDING_DIR, f"{int(time.time())}_{os.path.basename(filename)}")
+        os.makedirs(PENDING_DIR, exist_ok=True)
+        shutil.move(filename, pending_path)
+        for name, path in clip_artifacts(filename).items():
+            shutil.move(path, planned_artifacts(pending_path)[name])
+        await JOB_QUEUE.set_stage(job['job_id'], job['stage'], filename=pending_path)
+        job['filename'] = filename = pending_path
+    
+    if await JOB_QUEUE.record_failure(job['job_id'], reason):
+        logging.info(f"⏳ Saved clip for later upload: {filename} ({reason})")
     else:
-        async with CLIP_PROCESSING_SEMAPHORE:
-            await _process_clip_internal(filename, streamer, title, link, submitter, discord_submitter_id)
+        logging.error(f"🪦 Giving up on {os.path.basename(filename)} after {JOB_MAX_ATTEMPTS} attempts: {reason}")
+        await DEDUP.release_job(job['job_id'])
+        if os.path.exists(filename):
+            os.remove(filename)
+        remove_clip_artifacts(filename)
 
-async def _process_clip_internal(filename, streamer, title, link, submitter, discord_submitter_id):
-    """Internal clip processing function"""
+async def drop_job(job, reason):
+    """Mark a job as permanently failed and remove its file and artifacts"""
+    await JOB_QUEUE.mark_failed(job['job_id'], reason)
+    await DEDUP.release_job(job['job_id'])
+    if os.path.exists(job['filename']):
+        os.remove(job['filename'])
+    remove_clip_artifacts(job['filename'])
+
+async def probe_media(filename):
+    """Return ffprobe's format/stream description of a file, or None if it cannot be probed"""
     try:
-        logging.info(f'🎬 Processing clip: {os.path.basename(filename)}')
-        temp_filename = f"{filename}.temp.mp4"
-        
-        # Compress video asynchronously
-        ffmpeg_cmd = [
-            'ffmpeg', '-i', filename,
-            '-vcodec', 'libx264',
-            '-crf', '23',
-            '-y',
-            temp_filename
-        ]
-        
-        logging.debug(f'🔧 Starting FFmpeg compression for {os.path.basename(filename)}')
-        # Run FFmpeg asynchronously to avoid blocking the event loop
         process = await asyncio.create_subprocess_exec(
-            *ffmpeg_cmd,
+            'ffprobe', '-v', 'error', '-print_format', 'json', '-show_format', '-show_streams', filename,
             stdout=asyncio.subprocess.PIPE,
             stderr=asyncio.subprocess.PIPE
         )
-        stdout, stderr = await process.communicate()
-        
+        try:
+            stdout, stderr = await asyncio.wait_for(process.communicate(), timeout=FFPROBE_TIMEOUT)
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+            logging.warning(f'⚠️ ffprobe timed out after {FFPROBE_TIMEOUT}s for {os.path.basename(filename)}')
+            return None
         if process.returncode != 0:
-            raise subprocess.SubprocessError(f"FFmpeg failed with return code {process.returncode}: {stderr.decode()}")
-            
-        logging.info(f'✅ Video compression completed for {os.path.basename(filename)}')
+            logging.warning(f'⚠️ ffprobe failed for {os.path.basename(filename)}: {stderr.decode().strip()}')
+            return None
+        return json.loads(stdout)
+    except (OSError, ValueError) as e:
+        logging.warning(f'⚠️ ffprobe unavailable for {os.path.basename(filename)}: {str(e)}')
+        return None
+
+def choose_transcode_policy(probe, size):
+    """Pick 'remux', 'fast' or 'full' for a clip and describe why"""
+    if not probe:
+        return 'full', 'no probe data'
+    
+    streams = probe.get('streams', [])
+    video = next((stream for stream in streams if stream.get('codec_type') == 'video'), None)
+    audio = next((stream for stream in streams if stream.get('codec_type') == 'audio'), None)
+    if not video:
+        return 'full', 'no video stream'
+    
+    codec = video.get('codec_name')
+    height = int(video.get('height') or 0)
+    bitrate_kbps = int(probe.get('format', {}).get('bit_rate') or 0) // 1000
+    size_mb = size / 1024 / 1024
+    summary = f"{codec} {height}p {bitrate_kbps}kbps {size_mb:.1f}MB"
+    
+    if (codec in REMUX_CODECS
+            and (audio is None or audio.get('codec_name') in REMUX_AUDIO_CODECS)
+            and height <= REMUX_MAX_HEIGHT
+            and bitrate_kbps <= REMUX_MAX_BITRATE_KBPS
+            and size_mb <= REMUX_MAX_FILESIZE_MB):
+        return 'remux', summary
+    if size_mb <= FAST_ENCODE_MAX_FILESIZE_MB:
+        return 'fast', summary
+    return 'full', summary
+
+def build_ffmpeg_cmd(policy, source, destination, threads, fragmented=False, artifacts=None):
+    """FFmpeg command line for a transcode policy; fragmented output can be written to a pipe.
+
+    `artifacts` maps 'poster'/'preview' to extra outputs rendered from the same decode of the source.
+    """
+    if policy == 'remux':
+        codec_args = ['-c', 'copy']
+    elif policy == 'fast':
+        codec_args = ['-vcodec', 'libx264', '-preset', FAST_ENCODE_PRESET, '-crf', '23']
+    else:
+        codec_args = ['-vcodec', 'libx264', '-crf', '23']
+    if fragmented:
+        container_args = ['-movflags', 'frag_keyframe+empty_moov+default_base_moof', '-f', 'mp4']
+    else:
+        container_args = ['-movflags', '+faststart']
+    # Progress goes to stderr as key=value lines for the watchdog; stdout may carry the clip itself
+    artifact_args = []
+    if artifacts and 'poster' in artifacts:
+        quality_args = ['-quality', '80'] if artifacts['poster'].endswith('.webp') else ['-q:v', '3']
+        artifact_args += ['-map', '0:v:0', '-vf', f'scale={POSTER_WIDTH}:-2', '-frames:v', '1', '-an',
+                          *quality_args, '-y', artifacts['poster']]
+    if artifacts and 'preview' in artifacts:
+        artifact_args += ['-map', '0:v:0', '-t', str(PREVIEW_SECONDS), '-vf', f'scale={PREVIEW_WIDTH}:-2', '-an',
+                          '-vcodec', 'libx264', '-preset', 'veryfast', '-crf', '30', '-threads', '1',
+                          '-movflags', '+faststart', '-y', artifacts['preview']]
+    return ['ffmpeg', '-nostats', '-progress', 'pipe:2', '-i', source, *codec_args, '-threads', str(threads),
+            *container_args, '-y', destination, *artifact_args]
+
+def planned_artifacts(filename):
+    """Paths of the poster and preview to render for a clip, keyed by their upload field name"""
+    artifacts = {}
+    if POSTER_FORMAT:
+        artifacts['poster'] = f'{filename}.poster.{POSTER_FORMAT}'
+    if PREVIEW_SECONDS:
+        artifacts['preview'] = f'{filename}.preview.mp4'
+    return artifacts
+
+def clip_artifacts(filename):
+    """The artifacts rendered for a clip that are present on disk"""
+    return {name: path for name, path in planned_artifacts(filename).items() if os.path.exists(path)}
+
+def remove_clip_artifacts(filename):
+    for path in planned_artifacts(filename).values():
+        if os.path.exists(path):
+            os.remove(path)
+
+def artifact_content_type(path):
+    return ARTIFACT_CONTENT_TYPES.get(os.path.splitext(path)[1], 'application/octet-stream')
 
-        shutil.move(temp_filename, filename)
-        logging.debug(f'📁 Replaced original file with compressed version: {os.path.basename(filename)}')
+async def read_artifact(path):
+    """Stream an artifact rendered alongside a streamed clip; one that failed to render is sent empty"""
+    if os.path.exists(path):
+        yield await asyncio.get_running_loop().run_in_executor(None, read_file_chunk, path, 0, None)
 
-        # Upload clip asynchronously
-        response = await upload_clip_async(filename, streamer, title, link, submitter, discord_submitter_id)
+class WatchdogExpired(asyncio.TimeoutError):
+    """Raised when an FFmpeg or yt-dlp job overruns its deadline or stops making progress"""
+
+def stage_deadline(duration, minimum, seconds_per_clip_second):
+    """Deadline in seconds for a stage, scaled with the clip duration"""
+    if not duration or duration == float('inf'):
+        duration = MAX_CLIP_DURATION
+    return minimum + seconds_per_clip_second * duration
+
+FFMPEG_PROGRESS_LINE = re.compile(r'^[a-z0-9_]+=\S*$')
+
+async def watch_ffmpeg(process, name, duration, output_blocked=None):
+    """Follow FFmpeg's -progress output on stderr and kill it when it overruns or stalls.
+
+    output_blocked tells whether FFmpeg's piped output is waiting on its reader; an overrun while it is
+    raises UploadStalled instead of WatchdogExpired, since FFmpeg was only waiting on the upload.
+    Returns the remaining stderr lines (FFmpeg's own messages) once the process closes stderr.
+    """
+    deadline = stage_deadline(duration, FFMPEG_MIN_DEADLINE, FFMPEG_SECONDS_PER_CLIP_SECOND)
+    started = time.monotonic()
+    last_advance = started
+    last_report = started
+    out_time = 0.0
+    messages = collections.deque(maxlen=50)
+    
+    while True:
+        now = time.monotonic()
+        remaining = min(started + deadline, last_advance + FFMPEG_STALL_TIMEOUT) - now
+        if remaining <= 0:
+            process.kill()
+            if output_blocked is not None and output_blocked():
+                # The caller reaps FFmpeg once it stops reading; wait() cannot return while output is unread
+                raise UploadStalled(f'the upload stopped taking FFmpeg output at {out_time:.1f}s')
+            await process.wait()
+            if now >= started + deadline:
+                raise WatchdogExpired(f'FFmpeg overran its {deadline:.0f}s deadline at {out_time:.1f}s of output')
+            raise WatchdogExpired(f'FFmpeg made no progress for {FFMPEG_STALL_TIMEOUT}s at {out_time:.1f}s of output')
+        try:
+            line = await asyncio.wait_for(process.stderr.readline(), timeout=remaining)
+        except asyncio.TimeoutError:
+            continue
+        if not line:
+            return ''.join(messages)
+        
+        text = line.decode(errors='replace').strip()
+        if not FFMPEG_PROGRESS_LINE.match(text):
+            messages.append(text + '\n')
+            continue
+        key, _, value = text.partition('=')
+        if key == 'out_time_us' and value.isdigit() and int(value) / 1e6 > out_time:
+            out_time = int(value) / 1e6
+            last_advance = time.monotonic()
+        elif key == 'progress' and now - last_report >= FFMPEG_PROGRESS_LOG_INTERVAL:
+            last_report = now
+            speed = out_time / (now - started) if now > started else 0
+            if speed and duration != float('inf'):
+                eta = max(0.0, duration - out_time) / speed
+                logging.info(f'⏳ FFmpeg {name}: {out_time:.0f}/{duration:.0f}s at {speed:.1f}x, about {eta:.0f}s left')
+            else:
+                logging.info(f'⏳ FFmpeg {name}: {out_time:.0f}s of output at {speed:.1f}x')
+
+class TranscodeScheduler:
+    """Admits FFmpeg jobs by priority, then shortest-first, into a number of slots sized from the available cores"""
+
+    def __init__(self, slots=None):
+        self.cores = os.cpu_count() or 1
+        self.configured_slots = slots
+        self.running = 0
+        self.waiters = []  # heap of (priority, duration, sequence, future)
+        self.sequence = itertools.count()
+        self.admitted = 0
+        self.total_wait = 0.0
+
+    @property
+    def slots(self):
+        return self.configured_slots or max(1, self.cores // TRANSCODE_THREADS_PER_JOB)
+
+    @property
+    def queue_depth(self):
+        return sum(1 for *_, future in self.waiters if not future.cancelled())
+
+    def set_slots(self, slots):
+        """Change the slot limit at runtime; None or 0 goes back to sizing from the CPU count"""
+        slots = int(slots or 0) or None
+        if slots != self.configured_slots:
+            self.configured_slots = slots
+            logging.info(f"⚙️ Transcode slots set to {self.slots} ({'configured' if slots else 'auto'}, {self.cores} cores)")
+            self._wake()
+
+    def threads_per_job(self):
+        """FFmpeg thread count for the next job, scaled down when the host is already loaded"""
+        threads = max(1, self.cores // self.slots)
+        try:
+            load = os.getloadavg()[0]
+        except (AttributeError, OSError):
+            return threads
+        if load > self.cores:
+            threads = max(1, int(threads * self.cores / load))
+        return threads
+
+    async def acquire(self, duration, priority=LIVE_PRIORITY):
+        if self.running < self.slots and not self.queue_depth:
+            self.running += 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self.waiters, (priority, duration, next(self.sequence), future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self.release()
+            raise
+
+    def release(self):
+        self.running -= 1
+        self._wake()
+
+    def _wake(self):
+        while self.waiters and self.running < self.slots:
+            *_, future = heapq.heappop(self.waiters)
+            if future.cancelled():
+                continue
+            self.running += 1
+            future.set_result(None)
+
+    @contextlib.asynccontextmanager
+    async def slot(self, duration, name, priority=LIVE_PRIORITY):
+        """Hold a transcode slot for the duration of the block; yields the FFmpeg thread count"""
+        queued_at = time.monotonic()
+        await self.acquire(duration, priority)
+        wait = time.monotonic() - queued_at
+        METRICS.observe('clip_queue_wait_seconds', wait, queue='transcode_slot')
+        METRICS.observe('transcode_slot_occupancy', self.running / self.slots)
+        self.admitted += 1
+        self.total_wait += wait
+        threads = self.threads_per_job()
+        logging.info(f"⏱️ Transcode slot for {name} after {wait:.1f}s wait "
+                     f"(running {self.running}/{self.slots}, queued {self.queue_depth}, {threads} threads, "
+                     f"avg wait {self.total_wait / self.admitted:.1f}s)")
+        try:
+            yield threads
+        finally:
+            self.release()
+
+TRANSCODE_SCHEDULER = TranscodeScheduler(TRANSCODE_SLOTS)
+METRICS.gauge('transcode_slots', 'Transcode slot limit', lambda: TRANSCODE_SCHEDULER.slots)
+METRICS.gauge('transcode_slots_busy', 'Transcode slots in use', lambda: TRANSCODE_SCHEDULER.running)
+METRICS.gauge('transcode_queue_depth', 'Clips waiting for a transcode slot', lambda: TRANSCODE_SCHEDULER.queue_depth)
+
+def probe_duration(probe):
+    """Clip duration in seconds from ffprobe output; unknown durations sort last"""
+    try:
+        return float(probe['format']['duration'])
+    except (TypeError, KeyError, ValueError):
+        return float('inf')
+
+async def transcode_to_file(filename, temp_filename, policy, threads, duration):
+    """Run FFmpeg for a policy under the watchdog, writing the result next to the source"""
+    ffmpeg_cmd = build_ffmpeg_cmd(policy, filename, temp_filename, threads, artifacts=planned_artifacts(filename))
+    
+    logging.debug('🔧 Starting FFmpeg %s for %s', policy, os.path.basename(filename))
+    # Run FFmpeg asynchronously to avoid blocking the event loop
+    process = await asyncio.create_subprocess_exec(
+        *ffmpeg_cmd,
+        stdout=asyncio.subprocess.DEVNULL,
+        stderr=asyncio.subprocess.PIPE
+    )
+    stderr = await watch_ffmpeg(process, os.path.basename(filename), duration)
+    await process.wait()
+    
+    if process.returncode != 0:
+        raise subprocess.SubprocessError(f"FFmpeg failed with return code {process.returncode}: {stderr}")
+        
+    logging.info(f'✅ Video compression completed for {os.path.basename(filename)}')
+
+async def stream_clip_upload(job, policy, threads, duration):
+    """Pipe FFmpeg's fragmented MP4 output straight into the upload body.
+
+    Returns the backend response on success, or None when the caller should fall back to the file-based path.
+    """
+    filename = job['filename']
+    artifacts = planned_artifacts(filename)
+    ffmpeg_cmd = build_ffmpeg_cmd(policy, filename, 'pipe:1', threads, fragmented=True, artifacts=artifacts)
+    logging.debug('🔧 Starting streaming FFmpeg %s for %s', policy, os.path.basename(filename))
+    process = await asyncio.create_subprocess_exec(
+        *ffmpeg_cmd,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE
+    )
+    # Set while a chunk of output waits for the upload to take it; FFmpeg blocks on a full stdout
+    # pipe meanwhile, which the watchdog must not blame on the clip
+    upload_waiting = False
+    # Drain stderr concurrently so FFmpeg never blocks on a full pipe; an overrun kills FFmpeg,
+    # which ends the body early, and is raised below instead of falling back to another attempt
+    stderr_task = asyncio.create_task(watch_ffmpeg(process, os.path.basename(filename), duration, lambda: upload_waiting))
+    job['streamed_bytes'] = 0
+
+    async def ffmpeg_output():
+        nonlocal upload_waiting
+        while True:
+            chunk = await process.stdout.read(STREAMING_CHUNK_SIZE)
+            if not chunk:
+                break
+            job['streamed_bytes'] += len(chunk)
+            upload_waiting = True
+            yield chunk
+            upload_waiting = False
+        # Abort the request body instead of letting the backend store a truncated clip
+        if await process.wait() != 0:
+            raise subprocess.SubprocessError(f"FFmpeg failed with return code {process.returncode}")
+
+    async def send():
+        # The body can only be sent once, so the token is refreshed up front rather than replayed
+        token = await TOKENS.get()
+        with BANDWIDTH.transfer(bandwidth_host(BACKEND_URL)) as transfer:
+            return await BACKEND.upload_clip_stream(token, os.path.basename(filename), ffmpeg_output(), clip_fields(job), artifacts, transfer)
+
+    def upload_stalled():
+        return stderr_task.done() and not stderr_task.cancelled() and isinstance(stderr_task.exception(), UploadStalled)
+
+    upload_task = asyncio.create_task(send())
+    # A request blocked writing to a backend that stopped reading never notices FFmpeg was killed
+    stderr_task.add_done_callback(lambda task: upload_stalled() and upload_task.cancel())
+    try:
+        response = await upload_task
+    except asyncio.CancelledError:
+        if not upload_stalled():
+            raise
+        response = None
+    except Exception as e:
+        logging.warning(f'⚠️ Streaming upload failed for {os.path.basename(filename)}, falling back to file-based processing: {str(e)}')
+        response = None
+    finally:
+        if process.returncode is None:
+            process.kill()
+            # Output nobody will read keeps the pipe open, and wait() with it
+            while await process.stdout.read(STREAMING_CHUNK_SIZE):
+                pass
+            await process.wait()
+        try:
+            stderr = await stderr_task
+        except UploadStalled as e:
+            # A backend or network stall rather than a bad clip; the file-based path transcodes
+            # without waiting on the upload, and the watchdog does not count it as an overrun
+            stderr = str(e)
+            response = None
+            logging.warning(f'⚠️ Streaming upload of {os.path.basename(filename)} stalled, falling back to file-based processing: {e}')
+            METRICS.inc('clip_failures_total', reason='stream_stalled')
+    
+    if response is None:
+        logging.debug('FFmpeg stderr: %s', Payload(stderr))
+        return None
+    if response.status != 200:
+        logging.warning(f'⚠️ Streaming upload rejected ({response.status}) for {os.path.basename(filename)}, falling back to file-based processing')
+        return None
+    return response
+
+async def process_clip(job):
+    """Process a clip asynchronously with compression and upload"""
+    # Runs in its own task, so the correlation id only tags this clip's records
+    CLIP_CONTEXT.set(job.get('clip_id') or f'job-{job["job_id"]}')
+    try:
+        await _process_clip_internal(job)
+    finally:
+        await JOB_QUEUE.release(job['job_id'])
+        ACTIVE_JOB_IDS.discard(job['job_id'])
+        DISK_BUDGET.settle(job['job_id'], job['filename'])
+
+async def _process_clip_internal(job):
+    """Internal clip processing function; resumes from the job's recorded stage"""
+    filename = job['filename']
+    temp_filename = f"{filename}.temp.mp4"
+    try:
+        if not os.path.exists(filename):
+            logging.error(f'❌ File for job {job["job_id"]} is missing: {filename}')
+            METRICS.inc('clip_failures_total', reason='file_missing')
+            await drop_job(job, 'file missing')
+            return False
+        
+        response = None
+        if job['stage'] == 'downloaded':
+            logging.info(f'🎬 Processing clip: {os.path.basename(filename)}')
+            
+            # Skip or cheapen the re-encode when the source is already a reasonable H.264 file
+            source_size = os.path.getsize(filename)
+            with METRICS.timer('ffprobe'):
+                probe = await probe_media(filename)
+            policy, reason = choose_transcode_policy(probe, source_size)
+            logging.info(f'🧭 Transcode policy for {os.path.basename(filename)}: {policy} ({reason})')
+            
+            # Short clips are admitted first so they never wait behind a long cut
+            duration = probe_duration(probe)
+            async with TRANSCODE_SCHEDULER.slot(duration, os.path.basename(filename), job.get('priority', LIVE_PRIORITY)) as threads:
+                if STREAMING_UPLOADS and policy in STREAMING_POLICIES:
+                    with METRICS.timer('stream_upload'):
+                        response = await stream_clip_upload(job, policy, threads, duration)
+                if response is None:
+                    with METRICS.timer('transcode'):
+                        await transcode_to_file(filename, temp_filename, policy, threads, duration)
+            
+            METRICS.inc('clip_transcodes_total', policy=policy)
+            streamed_bytes = job.pop('streamed_bytes', 0)
+            output_size = streamed_bytes if response is not None else os.path.getsize(temp_filename)
+            if source_size:
+                METRICS.observe('clip_compression_ratio', output_size / source_size)
+            
+            if response is None:
+                shutil.move(temp_filename, filename)
+                logging.debug('📁 Replaced original file with compressed version: %s', os.path.basename(filename))
+                job['stage'] = 'transcoded'
+                await JOB_QUEUE.set_stage(job['job_id'], 'transcoded')
+
+            uploaded_bytes = output_size
+        
+        if response is None:
+            # Upload clip asynchronously
+            uploaded_bytes = os.path.getsize(filename)
+            response = await upload_clip_async(job)
         
         if response and response.status == 200:
             logging.info(f'🚀 Clip uploaded successfully: {os.path.basename(filename)} - Removing local file')
+            await JOB_QUEUE.set_stage(job['job_id'], 'uploaded')
+            METRICS.inc('clips_uploaded_total')
+            METRICS.inc('clip_bytes_total', uploaded_bytes, direction='uploaded')
+            if 'received_at' in job:
+                METRICS.observe('clip_stage_seconds', time.monotonic() - job['received_at'], stage='end_to_end')
+            try:
+                await DEDUP.link(job['job_id'], (await response.json())['clip']['_id'])
+            except (ValueError, KeyError, TypeError, aiohttp.ContentTypeError):
+                logging.debug('No clip id in upload response for job %s', job['job_id'])
             if os.path.exists(filename):
                 os.remove(filename)
+            remove_clip_artifacts(filename)
             return True
-        elif response and response.status == 401:
-            logging.warning("🔑 Token expired during upload, attempting to refresh...")
-            try:
-                refresh_token()
-            except Exception as e:
-                logging.error(f"❌ Failed to refresh token after 401: {e}")
-            finally:
-                if os.path.exists(filename):
-                    os.remove(filename)
+        elif response and response.status in AUTH_FAILURE_STATUSES:
+            logging.warning("🔑 Token still rejected after refreshing, keeping clip for retry")
+            METRICS.inc('clip_failures_total', reason='token_rejected')
+            await park_for_retry(job, 'token rejected')
+            return False
+        elif response and response.status >= 500:
+            logging.error(f'❌ Upload failed: Server error ({response.status}) - Keeping {os.path.basename(filename)} for retry')
+            METRICS.inc('clip_failures_total', reason='server_error')
+            await park_for_retry(job, f'server error {response.status}')
             return False
         elif response:
             error_msg = f"Server error ({response.status})"
@@ -181,105 +1728,206 @@ async def _process_clip_internal(filename, streamer, title, link, submitter, dis
             except:
                 pass
             logging.error(f'❌ Upload failed: {error_msg} - Removing file: {os.path.basename(filename)}')
-            if os.path.exists(filename):
-                os.remove(filename)
+            METRICS.inc('clip_failures_total', reason='upload_rejected')
+            await drop_job(job, error_msg)
             return False
         else:
-            # Upload failed or was saved for later
-            logging.warning(f'⚠️ Upload failed for {os.path.basename(filename)} - File removed')
-            if os.path.exists(filename):
-                os.remove(filename)
+            # Backend unreachable, keep the clip and let the drainer retry it
+            logging.warning(f'⚠️ Upload failed for {os.path.basename(filename)} - Keeping file for retry')
+            METRICS.inc('clip_failures_total', reason='backend_unreachable')
+            await park_for_retry(job, 'backend unreachable')
             return False
 
+    except WatchdogExpired as e:
+        # A slow host can overrun once; an input that keeps overrunning is dead-lettered
+        logging.error(f'⏰ Watchdog killed processing of {os.path.basename(filename)}: {str(e)}')
+        METRICS.inc('clip_failures_total', reason='watchdog')
+        if os.path.exists(temp_filename):
+            os.remove(temp_filename)
+        if job['stage'] == 'downloaded':
+            remove_clip_artifacts(filename)
+        # Only overruns count here; earlier failures such as an unreachable backend do not
+        if await JOB_QUEUE.record_overrun(job['job_id']) >= WATCHDOG_MAX_ATTEMPTS:
+            await drop_job(job, str(e))
+        else:
+            await park_for_retry(job, str(e))
+        return False
     except (subprocess.SubprocessError, asyncio.TimeoutError) as e:
-        logging.error(f'💥 Processing error for {os.path.basename(filename) if "filename" in locals() else "unknown file"}: {str(e)}')
-        if 'temp_filename' in locals() and os.path.exists(temp_filename):
+        logging.error(f'💥 Processing error for {os.path.basename(filename)}: {str(e)}')
+        METRICS.inc('clip_failures_total', reason='timeout' if isinstance(e, asyncio.TimeoutError) else 'ffmpeg')
+        if os.path.exists(temp_filename):
             os.remove(temp_filename)
-        if os.path.exists(filename):
-            os.remove(filename)
+        if job['stage'] == 'downloaded':
+            remove_clip_artifacts(filename)
+        await drop_job(job, str(e)[:500])
         return False
     except Exception as e:
-        logging.error(f'💥 Unexpected error during clip processing for {os.path.basename(filename) if "filename" in locals() else "unknown file"}: {str(e)}')
-        if os.path.exists(filename):
-            os.remove(filename)
+        logging.error(f'💥 Unexpected error during clip processing for {os.path.basename(filename)}: {str(e)}')
+        METRICS.inc('clip_failures_total', reason='unexpected')
+        if os.path.exists(temp_filename):
+            os.remove(temp_filename)
+        if job['stage'] == 'downloaded':
+            remove_clip_artifacts(filename)
+        await park_for_retry(job, f'unexpected error: {e}')
         return False
 
-def refresh_token():
-    global BACKEND_TOKEN
-    BACKEND_TOKEN = get_backend_token()
-    logging.debug(f'Refreshed backend token: {BACKEND_TOKEN}')
+class UploadStalled(Exception):
+    """Raised when an upload stops making progress"""
 
-async def upload_clip_async(filename, streamer, title, link, submitter, discord_submitter_id):
-    """Upload clip asynchronously to avoid blocking the event loop"""
-    global BACKEND_TOKEN, BACKEND_URL
-    
-    if not BACKEND_TOKEN:
+def upload_deadline(size):
+    """Seconds allowed to send `size` bytes: a stall allowance plus the minimum acceptable throughput"""
+    return UPLOAD_STALL_TIMEOUT + size / UPLOAD_MIN_THROUGHPUT
+
+def read_file_chunk(filename, offset, size):
+    with open(filename, 'rb') as file_handle:
+        file_handle.seek(offset)
+        return file_handle.read(size)
+
+def clip_fields(job):
+    return {
+        'streamer': job['streamer'],
+        'title': job['title'],
+        'link': job['link'],
+        'submitter': job['submitter'],
+        'discordSubmitterId': str(job['discord_submitter_id']),
+    }
+
+class UploadSessionLost(Exception):
+    """Raised when the backend no longer knows an upload session, e.g. it expired or lost a chunk in a race"""
+
+# Session endpoint statuses that mean the session has to be started over rather than the clip rejected
+UPLOAD_SESSION_LOST_STATUSES = (404, 409)
+
+async def upload_clip_resumable(job, fields, transfer):
+    """Send a clip in chunks, resuming from the backend's acknowledged offset after a failure, and
+    starting over with a new session once if the backend lost the current one.
+
+    Returns the backend response, or None if the backend has no resumable upload endpoint.
+    """
+    for attempt in range(2):
         try:
-            BACKEND_TOKEN = get_backend_token()
-        except Exception as e:
-            logging.error(f"Failed to refresh token before upload: {e}")
-            save_path = f"downloads/pending/{int(time.time())}_{os.path.basename(filename)}"
-            os.makedirs(os.path.dirname(save_path), exist_ok=True)
-            shutil.move(filename, save_path)
-            logging.info(f"Saved clip for later upload: {save_path}")
-            return None
+            return await send_resumable_upload(job, fields, transfer)
+        except UploadSessionLost as e:
+            logging.warning(f'⚠️ Upload session of {os.path.basename(job["filename"])} was lost ({e}), starting a new one')
+            job['upload_id'] = None
+            await JOB_QUEUE.set_upload_id(job['job_id'], None)
+    # Parked for a later attempt instead of being dropped as rejected
+    raise UploadStalled('the backend lost the upload session twice')
 
-    max_upload_retries = 3
-    for attempt in range(1, max_upload_retries + 1):
+async def send_resumable_upload(job, fields, transfer):
+    filename = job['filename']
+    size = os.path.getsize(filename)
+    upload_id = job.get('upload_id')
+    offset = None
+    
+    # Resume an upload started by an earlier attempt of this job
+    if upload_id:
+        response = await call_with_token(lambda token: BACKEND.get_upload(token, upload_id))
+        if response.status == 200:
+            offset = (await response.json())['offset']
+            logging.info(f'⏯️ Resuming upload of {os.path.basename(filename)} at {offset}/{size} bytes')
+    
+    if offset is None:
+        response = await call_with_token(lambda token: BACKEND.start_upload(token, os.path.basename(filename), size))
+        if response.status == 404:
+            return None
+        if response.status != 200:
+            return response
+        upload_id = (await response.json())['uploadId']
+        offset = 0
+        job['upload_id'] = upload_id
+        await JOB_QUEUE.set_upload_id(job['job_id'], upload_id)
+    
+    loop = asyncio.get_running_loop()
+    stalls = 0
+    while offset < size:
+        chunk = await loop.run_in_executor(None, read_file_chunk, filename, offset, UPLOAD_CHUNK_SIZE)
         try:
-            async with aiohttp.ClientSession() as session:
-                with open(filename, 'rb') as file_handle:
-                    data = aiohttp.FormData()
-                    data.add_field('clip', file_handle, filename=os.path.basename(filename))
-                    data.add_field('streamer', streamer)
-                    data.add_field('title', title)
-                    data.add_field('link', link)
-                    data.add_field('submitter', submitter)
-                    data.add_field('discordSubmitterId', str(discord_submitter_id))
-                    
-                    headers = {'Authorization': f'Bearer {BACKEND_TOKEN}'}
-                    
-                    async with session.post(f'{BACKEND_URL}/api/clips', data=data, headers=headers, timeout=aiohttp.ClientTimeout(total=30)) as response:
-                        response_text = await response.text()
-                        logging.debug(f'Response from server: {response_text}')
-                        return response
-                    
+            response = await asyncio.wait_for(
+                call_with_token(lambda token: BACKEND.put_upload_chunk(token, upload_id, offset, chunk, transfer)),
+                timeout=upload_deadline(len(chunk))
+            )
+            if response.status == 404:
+                raise UploadSessionLost('chunk upload answered 404')
+            if response.status not in (200, 409):
+                return response
+            new_offset = (await response.json())['offset']
         except (aiohttp.ClientError, asyncio.TimeoutError) as e:
-            if attempt == max_upload_retries:
-                logging.error(f"Failed to upload after {max_upload_retries} attempts: {e}")
-                save_path = f"downloads/pending/{int(time.time())}_{os.path.basename(filename)}"
-                os.makedirs(os.path.dirname(save_path), exist_ok=True)
-                shutil.move(filename, save_path)
-                logging.info(f"Saved clip for later upload: {save_path}")
-                return None
-            else:
-                logging.warning(f"Upload attempt {attempt} failed: {e}, retrying...")
-                await asyncio.sleep(2 * attempt)
-        except Exception as e:
-            logging.error(f"Unexpected error during upload: {e}")
-            if os.path.exists(filename):
-                os.remove(filename)
-            return None
+            logging.warning(f'⚠️ Chunk at offset {offset} of {os.path.basename(filename)} failed: {e or type(e).__name__}')
+            await asyncio.sleep(2 * (stalls + 1))
+            response = await call_with_token(lambda token: BACKEND.get_upload(token, upload_id))
+            if response.status == 404:
+                raise UploadSessionLost('upload status answered 404')
+            if response.status != 200:
+                return response
+            new_offset = (await response.json())['offset']
+        
+        if new_offset > offset:
+            stalls = 0
+        else:
+            stalls += 1
+            if stalls > UPLOAD_MAX_STALLS:
+                raise UploadStalled(f'no progress at offset {offset} after {stalls} attempts')
+            await asyncio.sleep(1)
+        offset = new_offset
     
-    return None
+    artifacts = clip_artifacts(filename)
+    response = await call_with_token(lambda token: BACKEND.complete_upload(token, upload_id, fields, artifacts))
+    if response.status in UPLOAD_SESSION_LOST_STATUSES:
+        raise UploadSessionLost(f'completing the upload answered {response.status}')
+    return response
+
+async def upload_clip_async(job):
+    """Upload clip asynchronously to avoid blocking the event loop"""
+    filename = job['filename']
+    fields = clip_fields(job)
+    try:
+        with METRICS.timer('upload'), BANDWIDTH.transfer(bandwidth_host(BACKEND_URL)) as transfer:
+            response = await upload_clip_resumable(job, fields, transfer)
+        if response is None:
+            logging.info('ℹ️ Backend has no resumable upload endpoint, sending the clip in one request')
+            with METRICS.timer('upload'), BANDWIDTH.transfer(bandwidth_host(BACKEND_URL)) as transfer:
+                response = await call_with_token(lambda token: asyncio.wait_for(
+                    BACKEND.upload_clip(token, filename, fields, clip_artifacts(filename), transfer),
+                    timeout=upload_deadline(os.path.getsize(filename))
+                ))
+        if logger.isEnabledFor(logging.DEBUG):
+            logging.debug('Response from server: %s', Payload(await response.text()))
+        return response
+    except (aiohttp.ClientError, asyncio.TimeoutError, UploadStalled) as e:
+        logging.error(f"Failed to upload {os.path.basename(filename)}: {e or type(e).__name__}")
+        return None
+    except Exception as e:
+        logging.error(f"Unexpected error during upload: {e}")
+        return None
 
-def fetch_channel_ids():
-    global BACKEND_URL, CLIP_CHANNEL_IDS, BACKEND_TOKEN, BLACKLISTED_SUBMITTER_IDS, BLACKLISTED_STREAMERS
+def apply_set_update(target, values):
+    """Bring a lookup set in line with the backend's list by adding and removing only what changed"""
+    added = values - target
+    removed = target - values
+    target.difference_update(removed)
+    target.update(added)
+    if added or removed:
+        logging.debug('Config set update: +%s -%s', Payload(sorted(map(str, added))), Payload(sorted(map(str, removed))))
+    return bool(added or removed)
+
+async def fetch_channel_ids():
+    global ADMIN_CONFIG_ETAG
     max_retries = 3
     retry_delay = 2
     
     for attempt in range(1, max_retries + 1):
         try:
-            if not BACKEND_TOKEN:
-                refresh_token()
+            logging.debug('🔍 Fetching channel IDs and blacklists from backend (attempt %d/%d)', attempt, max_retries)
+            response = await call_with_token(lambda token: BACKEND.get_admin_config(token, ADMIN_CONFIG_ETAG))
+            status = response.status
             
-            headers = {'Authorization': f'Bearer {BACKEND_TOKEN}'}
-            logging.debug(f"🔍 Fetching channel IDs and blacklists from backend (attempt {attempt}/{max_retries})")
-            response = requests.get(f"{BACKEND_URL}/api/config/admin", headers=headers, timeout=10)
+            if status == 304:
+                logging.debug("📺 Admin config unchanged")
+                return
             
-            if response.status_code == 200:
-                config = response.json()
-                
+            if status == 200:
+                config = await response.json()
                 if config['admin']:
                     admin_config = config['admin']
                     
@@ -287,43 +1935,39 @@ def fetch_channel_ids():
                     if admin_config.get('clipChannelIds'):
                         channel_ids = admin_config['clipChannelIds']
                         if channel_ids and len(channel_ids) > 0:
-                            CLIP_CHANNEL_IDS = [int(channel_id) for channel_id in channel_ids if channel_id]
-                            logging.info(f"📺 Updated clip channel IDs from backend: {CLIP_CHANNEL_IDS}")
+                            if apply_set_update(CLIP_CHANNEL_IDS, {int(channel_id) for channel_id in channel_ids if channel_id}):
+                                logging.info(f"📺 Updated clip channel IDs from backend: {sorted(CLIP_CHANNEL_IDS)}")
                         else:
                             logging.warning("⚠️ Empty channel IDs list in config, keeping current list")
                     else:
                         logging.warning("⚠️ No clip channel IDs found in config, keeping current list")
                     
+                    # Update transcode concurrency (0 or missing means size from the CPU count)
+                    TRANSCODE_SCHEDULER.set_slots(admin_config.get('botMaxConcurrentClips') or TRANSCODE_SLOTS)
+                    
                     # Update blacklisted submitter IDs
                     blacklisted_submitters = admin_config.get('blacklistedSubmitters', [])
                     # Extract user IDs from the new structure
-                    current_ids = [str(submitter.get('userId', '')) for submitter in blacklisted_submitters if submitter.get('userId', '').strip()]
-                    if current_ids != BLACKLISTED_SUBMITTER_IDS:
-                        BLACKLISTED_SUBMITTER_IDS = current_ids
+                    current_ids = {str(submitter.get('userId', '')) for submitter in blacklisted_submitters if submitter.get('userId', '').strip()}
+                    if apply_set_update(BLACKLISTED_SUBMITTER_IDS, current_ids):
                         logging.info(f"🚫 Updated blacklisted submitter IDs: {len(BLACKLISTED_SUBMITTER_IDS)} users")
                     
                     # Update blacklisted streamers
                     blacklisted_streamers = admin_config.get('blacklistedStreamers', [])
-                    if blacklisted_streamers != BLACKLISTED_STREAMERS:
-                        BLACKLISTED_STREAMERS = [streamer.strip().lower() for streamer in blacklisted_streamers if streamer.strip()]
+                    current_streamers = {streamer.strip().lower() for streamer in blacklisted_streamers if streamer.strip()}
+                    if apply_set_update(BLACKLISTED_STREAMERS, current_streamers):
                         logging.info(f"🚫 Updated blacklisted streamers: {len(BLACKLISTED_STREAMERS)} streamers")
                     
+                    # Only remember the version once it has been applied
+                    ADMIN_CONFIG_ETAG = response.headers.get('ETag')
                     return  # Success, exit the retry loop
                     
-            elif response.status_code == 401:
-                logging.warning("🔑 Token expired while fetching config, refreshing...")
-                try:
-                    refresh_token()
-                except Exception as token_error:
-                    logging.error(f"❌ Failed to refresh token: {token_error}")
-                    if attempt == max_retries:
-                        return
             else:
-                logging.warning(f"⚠️ Failed to fetch config, status code: {response.status_code}")
+                logging.warning(f"⚠️ Failed to fetch config, status code: {status}")
                 if attempt == max_retries:
                     return
                     
-        except requests.exceptions.RequestException as e:
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
             logging.error(f"🌐 Network error fetching config (attempt {attempt}/{max_retries}): {str(e)}")
             if attempt == max_retries:
                 return
@@ -334,14 +1978,73 @@ def fetch_channel_ids():
         
         # Wait before retrying (except on last attempt)
         if attempt < max_retries:
-            logging.debug(f"⏳ Waiting {retry_delay} seconds before retry...")
-            time.sleep(retry_delay)
+            logging.debug('⏳ Waiting %s seconds before retry...', retry_delay)
+            await asyncio.sleep(retry_delay)
             retry_delay *= 1.5
 
+class ConfigSubscription:
+    """Socket.IO subscription to the backend's admin config change announcements"""
+
+    def __init__(self, base_url):
+        self.base_url = base_url
+        self.sio = None
+        self.connect_task = None
+        self.refresh_task = None
+        self.refresh_pending = False
+
+    @property
+    def connected(self):
+        return self.sio is not None and self.sio.connected
+
+    def start(self):
+        if not CONFIG_PUSH_UPDATES:
+            logging.info(f"📺 Config push updates disabled, polling every {CONFIG_POLL_INTERVAL}s")
+            return
+        if socketio is None:
+            logging.warning(f"⚠️ python-socketio is not installed, polling config every {CONFIG_POLL_INTERVAL}s")
+            return
+        
+        self.sio = socketio.AsyncClient(reconnection_delay_max=60)
+        self.sio.on('connect', self._on_connect)
+        self.sio.on('disconnect', self._on_disconnect)
+        self.sio.on('config:admin:updated', self._on_config_updated)
+        # With retry the client keeps reconnecting in the background, also after a failed first attempt
+        self.connect_task = asyncio.create_task(self.sio.connect(self.base_url, transports=['websocket'], retry=True))
+
+    async def close(self):
+        if self.sio is not None:
+            await self.sio.disconnect()
+        if self.connect_task is not None:
+            self.connect_task.cancel()
+
+    async def _on_connect(self):
+        logging.info("📡 Subscribed to backend config updates")
+        await self.sio.emit('authenticate', TOKENS.token)
+        # Changes made while the channel was down were never announced
+        self.request_refresh()
+
+    async def _on_disconnect(self, *args):
+        logging.warning(f"📡 Config update channel lost, polling every {CONFIG_POLL_INTERVAL}s until it is back")
+
+    async def _on_config_updated(self, data=None):
+        logging.info("📡 Backend announced a config change")
+        self.request_refresh()
+
+    def request_refresh(self):
+        """Re-fetch the admin config in the background; announcements during a fetch trigger one more"""
+        self.refresh_pending = True
+        if self.refresh_task is None or self.refresh_task.done():
+            self.refresh_task = asyncio.create_task(self._refresh())
+
+    async def _refresh(self):
+        while self.refresh_pending:
+            self.refresh_pending = False
+            await fetch_channel_ids()
+
+CONFIG_SUBSCRIPTION = ConfigSubscription(BACKEND_URL)
+
 def is_blacklisted(streamer_name, discord_submitter_id):
     """Check if a streamer or submitter is blacklisted"""
-    global BLACKLISTED_SUBMITTER_IDS, BLACKLISTED_STREAMERS
-    
     # Check if submitter is blacklisted
     if str(discord_submitter_id) in BLACKLISTED_SUBMITTER_IDS:
         logging.info(f"🚫 Submitter {discord_submitter_id} is blacklisted")
@@ -354,18 +2057,30 @@ def is_blacklisted(streamer_name, discord_submitter_id):
     
     return False, None
 
-def check_ffmpeg():
+async def check_ffmpeg():
+    """Check that FFmpeg runs, in the background so it never holds up startup; /ready reports the result"""
+    global FFMPEG_STATUS
     try:
-        result = subprocess.run(['ffmpeg', '-version'], check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        logging.info('✅ FFmpeg is installed and accessible')
-    except subprocess.CalledProcessError:
-        logging.error('❌ FFmpeg is installed but returned an error')
-        raise
+        process = await asyncio.create_subprocess_exec(
+            'ffmpeg', '-version',
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.DEVNULL
+        )
     except FileNotFoundError:
+        FFMPEG_STATUS = 'missing'
         logging.error('❌ FFmpeg is not installed or not found in PATH')
-        raise
-
-check_ffmpeg()
+        return
+    try:
+        await asyncio.wait_for(process.wait(), timeout=FFPROBE_TIMEOUT)
+    except asyncio.TimeoutError:
+        process.kill()
+        await process.wait()
+    if process.returncode:
+        FFMPEG_STATUS = 'error'
+        logging.error(f'❌ FFmpeg is installed but returned an error (exit code {process.returncode})')
+    else:
+        FFMPEG_STATUS = 'ok'
+        logging.info('✅ FFmpeg is installed and accessible')
 
 intents = discord.Intents.default()
 intents.message_content = True
@@ -373,26 +2088,35 @@ client = discord.Client(intents=intents)
 
 @client.event
 async def on_ready():
-    global CLIP_PROCESSING_SEMAPHORE
-    
+    global GATEWAY_DOWN_SINCE
+    GATEWAY_DOWN_SINCE = None
     logging.info(f'🤖 Bot logged in as {client.user}')
     
-    # Initialize the semaphore for concurrent clip processing
-    CLIP_PROCESSING_SEMAPHORE = asyncio.Semaphore(2)  # Process max 2 clips concurrently
-    logging.info("⚙️ Initialized clip processing semaphore (max 2 concurrent)")
+    logging.info(f"⚙️ Transcode scheduler: {TRANSCODE_SCHEDULER.slots} slots on {TRANSCODE_SCHEDULER.cores} cores")
     
-    # Fetch channel IDs on startup (with retry logic)
-    logging.info("📺 Refreshing channel configuration on startup...")
-    fetch_channel_ids()
+    # The catch-up stops at the newest message seen now; anything later arrives as a live message
+    latest = {channel.id: channel.last_message_id for channel in client.get_all_channels()
+              if getattr(channel, 'last_message_id', None)}
     
-    # Refresh token to ensure it's valid
-    try:
-        if BACKEND_TOKEN:
+    if not STARTUP.finished:
+        # The backend login and first config fetch run alongside the gateway connection
+        await STARTUP.wait()
+    else:
+        # on_ready fires again after a new session; pick up what changed while disconnected
+        logging.info("📺 Refreshing channel configuration after reconnecting...")
+        await fetch_channel_ids()
+        
+        # Make sure a valid token is available (refreshed only if missing or about to expire)
+        try:
             logging.info("🔑 Validating backend token...")
-        refresh_token()
-        logging.info("✅ Backend token refreshed and validated")
-    except Exception as e:
-        logging.error(f"❌ Failed to refresh token on startup: {e}")
+            await TOKENS.get()
+            logging.info("✅ Backend token validated")
+        except Exception as e:
+            logging.error(f"❌ Failed to refresh token after reconnecting: {e}")
+    
+    # Subscribe to config changes once; the client reconnects on its own
+    if CONFIG_SUBSCRIPTION.sio is None:
+        CONFIG_SUBSCRIPTION.start()
     
     # Only start the task if it's not already running
     if not refresh_config_task.is_running():
@@ -401,111 +2125,702 @@ async def on_ready():
     else:
         logging.debug("⏰ Config refresh task already running")
     
+    # Catch up on clips posted while the bot was offline; on_ready also fires after a new session
+    global BACKFILL_TASK, CATCH_UP_CHECKPOINTS
+    if CATCH_UP_CHECKPOINTS is not None and (BACKFILL_TASK is None or BACKFILL_TASK.done()):
+        BACKFILL_TASK = asyncio.create_task(backfill_channels(CATCH_UP_CHECKPOINTS, latest))
+        CATCH_UP_CHECKPOINTS = None
+    
     await client.change_presence(activity=discord.Activity(
         type=discord.ActivityType.watching, name='for clips'))
     logging.info("👁️ Bot presence set to 'Watching for clips'")
     
     logging.info("🎉 Bot startup completed successfully!")
 
-@tasks.loop(minutes=20)
+async def hold_catch_up():
+    """Snapshot the channel checkpoints for the next catch-up and keep messages handled meanwhile from
+    moving them past the gap. Runs before the gateway connects, since discord.py dispatches messages
+    before on_ready, and again when the connection drops while no catch-up is running."""
+    global CATCH_UP_CHECKPOINTS
+    if not BACKFILL_ENABLED or CATCH_UP_CHECKPOINTS is not None or (BACKFILL_TASK and not BACKFILL_TASK.done()):
+        return
+    CATCH_UP_CHECKPOINTS = await CHECKPOINTS.all()
+    for channel_id, checkpoint in CATCH_UP_CHECKPOINTS.items():
+        PENDING_MESSAGES.hold_floor(channel_id, checkpoint + 1)
+
+async def release_catch_up():
+    """Drop the snapshot when a resumed session replays the missed messages itself"""
+    global CATCH_UP_CHECKPOINTS
+    if CATCH_UP_CHECKPOINTS is None:
+        return
+    checkpoints, CATCH_UP_CHECKPOINTS = CATCH_UP_CHECKPOINTS, None
+    for channel_id in checkpoints:
+        await PENDING_MESSAGES.release_floor(channel_id)
+
+async def backfill_channels(checkpoints, latest):
+    """Replay messages posted between each channel's checkpoint and its newest message in `latest`
+    through the download queue.
+
+    Backfilled messages only enter the queue while it is empty, so live messages go first, and at
+    most BACKFILL_RATE_PER_MINUTE of them (0 for no limit); their jobs run at BACKFILL_PRIORITY.
+    """
+    oldest_allowed = discord.utils.time_snowflake(datetime.now(timezone.utc) - timedelta(hours=BACKFILL_MAX_AGE_HOURS))
+    for channel_id in checkpoints.keys() - CLIP_CHANNEL_IDS:
+        await PENDING_MESSAGES.release_floor(channel_id)
+    for channel_id in sorted(CLIP_CHANNEL_IDS):
+        channel = client.get_channel(channel_id)
+        if channel is None:
+            logging.warning(f"⚠️ Clip channel {channel_id} is not visible to the bot, skipping catch-up")
+            await PENDING_MESSAGES.release_floor(channel_id)
+            continue
+        
+        checkpoint = checkpoints.get(channel_id)
+        newest = latest.get(channel_id)
+        if checkpoint is None:
+            # A channel seen for the first time starts from now instead of its whole history
+            if newest:
+                await CHECKPOINTS.advance(channel_id, newest)
+            logging.info(f"📌 Started checkpointing channel {channel_id}")
+            continue
+        if newest is None:
+            await PENDING_MESSAGES.release_floor(channel_id)
+            continue
+        
+        queued = 0
+        start = max(checkpoint, oldest_allowed)
+        PENDING_MESSAGES.hold_floor(channel_id, start + 1)
+        try:
+            async for message in channel.history(limit=None, after=discord.Object(id=start), before=discord.Object(id=newest + 1), oldest_first=True):
+                if message.author == client.user or not clip_sources(message):
+                    PENDING_MESSAGES.hold_floor(channel_id, message.id + 1)
+                    await PENDING_MESSAGES.handled_message(channel_id, message.id)
+                    continue
+                if message.id in PENDING_MESSAGES:
+                    # Already queued live, e.g. held while the backend config was loading
+                    continue
+                while DOWNLOAD_QUEUE.qsize():
+                    await asyncio.sleep(1)
+                await enqueue_message(message, BACKFILL_PRIORITY)
+                PENDING_MESSAGES.hold_floor(channel_id, message.id + 1)
+                METRICS.inc('messages_backfilled_total')
+                queued += 1
+                if BACKFILL_RATE_PER_MINUTE > 0:
+                    await asyncio.sleep(60 / BACKFILL_RATE_PER_MINUTE)
+        except discord.HTTPException as e:
+            # The floor stays, so the unread part of the history is caught up on after the next restart
+            logging.error(f"❌ Could not read history of channel {channel_id}: {e}")
+        else:
+            await PENDING_MESSAGES.release_floor(channel_id)
+        if queued:
+            logging.info(f"⏪ Queued {queued} message(s) posted in channel {channel_id} while the bot was offline")
+
+@tasks.loop(seconds=CONFIG_POLL_INTERVAL)
 async def refresh_config_task():
-    fetch_channel_ids()
-    logging.info("Refreshed channel IDs and blacklists from backend config")
-    
-    if refresh_config_task.current_loop % 3 == 0 and refresh_config_task.current_loop > 0:
-        refresh_token()
-        logging.info("Refreshed backend token")
+    # Fallback only: while subscribed, changes arrive as push announcements
+    if CONFIG_SUBSCRIPTION.connected:
+        return
+    await fetch_channel_ids()
+    logging.debug("Refreshed channel IDs and blacklists from backend config")
 
 @refresh_config_task.before_loop
 async def before_refresh_task():
-    await client.wait_until_ready()
+    if BOT_MODE != 'worker':
+        await client.wait_until_ready()
+
+@client.event
+async def on_resumed():
+    global GATEWAY_DOWN_SINCE
+    GATEWAY_DOWN_SINCE = None
+    await release_catch_up()
+
+@client.event
+async def on_disconnect():
+    global GATEWAY_DOWN_SINCE
+    # Fires on every failed reconnect attempt too; keep the time of the first one
+    if GATEWAY_DOWN_SINCE is None:
+        GATEWAY_DOWN_SINCE = time.monotonic()
+        await hold_catch_up()
 
 @client.event
 async def on_message(message):
-    global CLIP_CHANNEL_IDS, BACKEND_TOKEN
-    
+    if not STARTUP.finished:
+        # Which channels to watch and who is blacklisted is only known once the backend config is loaded
+        if message.author != client.user:
+            STARTUP.held.append(message)
+        return
+
     if not CLIP_CHANNEL_IDS:
-        fetch_channel_ids()
-        if not CLIP_CHANNEL_IDS:
-            logging.warning("No clip channels configured, skipping message")
-            return
+        # Never wait on the backend here; the channel list arrives with the next config update or poll
+        logging.warning("No clip channels configured, skipping message")
+        return
 
     if message.author == client.user or message.channel.id not in CLIP_CHANNEL_IDS:
         return
     
-    url_pattern = r'(https?://[^\s]+)'
-    urls = re.findall(url_pattern, message.content)
-    filename = None
+    if DOWNLOAD_QUEUE is None:
+        logging.warning("Download queue not initialized yet, skipping message")
+        return
+    
+    # Hand the clips to the download workers so the gateway loop never waits on a download
+    sources = await enqueue_message(message, LIVE_PRIORITY)
+    if sources:
+        logging.debug('📬 Queued %d clip(s) from message %s for download (queue size: %d)', sources, message.id, DOWNLOAD_QUEUE.qsize())
 
-    if urls:
-        # await message.add_reaction('🔄')
-        url = urls[0].strip()
-        ydl_opts = {
-            'outtmpl': 'downloads/%(id)s.%(ext)s',
-            'ratelimit': 20 * 1024 * 1024,
-        }
-        logging.debug(f'📥 Received message with URL: {url}')
-
-        if 'youtube.com' in url or 'youtu.be' in url or 'twitch.tv' in url or 'medal.tv' in url:
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(url, download=True)
-                logging.debug(f'YoutubeDL info: {info}')
-                link = url
-                filename = ydl.prepare_filename(info or {})
-                streamer = (info or {}).get('creator') or (info or {}).get('channel') or (info or {}).get('uploader') or message.author.name
-                title = (info or {}).get('title', 'YT Clip')
-                submitter = message.author.name
-
-    elif message.attachments and 'cdn.discordapp.com' in message.attachments[0].url:
-        # await message.add_reaction('🔄')
-        split_v1 = str(message.attachments).split("filename='")[1]
-        filename = str(split_v1).split("' ")[0]
-        logging.debug(f'📎 Filename from message attachments: {filename}')
-        if filename.endswith(".mp4") or filename.endswith(".mov"):
-            filename = "downloads/{}".format(filename)
-            logging.debug(f'💾 New filename: {filename}')
-
-            os.makedirs(os.path.dirname(filename), exist_ok=True)
-
-            await message.attachments[0].save(fp=filename)
-            logging.debug(f'📁 Saved attachment to: {filename}')
-            streamer = message.author.name
-            title = "Discord Clip"
-            link = message.jump_url
-            submitter = message.author.name
-    
-    if filename:
-        # Check if submitter or streamer is blacklisted
-        is_blocked, block_type = is_blacklisted(streamer, message.author.id)
-        if is_blocked:
-            logging.info(f"🚫 Clip blocked: {block_type} is blacklisted (submitter: {message.author.name}, streamer: {streamer})")
+SUPPORTED_CLIP_HOSTS = ('youtube.com', 'youtu.be', 'twitch.tv', 'medal.tv')
+CLIP_ATTACHMENT_EXTENSIONS = ('.mp4', '.mov')
+
+def clip_sources(message):
+    """Every supported clip URL and video attachment in a message, in the order they appear"""
+    sources = []
+    for url in re.findall(r'(https?://[^\s]+)', message.content):
+        url = url.strip()
+        if any(host in url for host in SUPPORTED_CLIP_HOSTS) and url not in sources:
+            sources.append(url)
+    for attachment in message.attachments:
+        if 'cdn.discordapp.com' in attachment.url and attachment.filename.lower().endswith(CLIP_ATTACHMENT_EXTENSIONS):
+            sources.append(attachment)
+    return sources
+
+def describe_source(source):
+    return source if isinstance(source, str) else source.filename
+
+async def enqueue_message(message, priority):
+    """Queue each clip of a message as its own download, so they run in parallel; returns how many"""
+    sources = clip_sources(message)
+    if not sources:
+        await PENDING_MESSAGES.handled_message(message.channel.id, message.id)
+        return 0
+    PENDING_MESSAGES.add(message, len(sources))
+    for source in sources:
+        await DOWNLOAD_QUEUE.put((time.monotonic(), message, source, priority))
+    return len(sources)
+
+class DownloadWatchdog:
+    """Deadline and stall detection for a yt-dlp download, enforced from its progress hook"""
+
+    def __init__(self, name, duration):
+        self.name = name
+        self.deadline = stage_deadline(duration, YTDLP_MIN_DEADLINE, YTDLP_SECONDS_PER_CLIP_SECOND)
+        self.started = time.monotonic()
+        self.last_advance = self.started
+        self.downloaded = 0
+        self.expired = None
+
+    def remaining(self):
+        return self.started + self.deadline - time.monotonic()
+
+    def expire(self, reason):
+        """Abort the download at yt-dlp's next progress callback"""
+        if not self.expired:
+            self.expired = reason
+
+    def hook(self, progress):
+        now = time.monotonic()
+        downloaded = progress.get('downloaded_bytes') or 0
+        if downloaded > self.downloaded:
+            self.downloaded = downloaded
+            self.last_advance = now
+        if now - self.last_advance > YTDLP_STALL_TIMEOUT:
+            self.expire(f'no data for {YTDLP_STALL_TIMEOUT}s at {self.downloaded} bytes')
+        elif now - self.started > self.deadline:
+            self.expire(f'overran its {self.deadline:.0f}s deadline at {self.downloaded} bytes')
+        if self.expired:
+            raise yt_dlp.utils.DownloadCancelled(self.expired)
+
+def remove_partial_download(info):
+    """Delete whatever yt-dlp left behind for a clip, including .part and .ytdl files"""
+    for path in glob.glob(os.path.join('downloads', f"{glob.escape(str(info.get('id')))}.*")):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+def pacing_hook(transfer):
+    """yt-dlp progress hook that holds the download thread back to the transfer's bandwidth share"""
+    received = {}
+
+    def hook(progress):
+        downloaded = progress.get('downloaded_bytes') or 0
+        # Each file of a format merge counts from zero again
+        previous = received.get(progress.get('filename'), 0)
+        received[progress.get('filename')] = downloaded
+        if downloaded > previous:
+            transfer.consume_blocking(downloaded - previous)
+    return hook
+
+async def download_watched(info, ydl_opts, host):
+    """Run download_with_ytdlp in DOWNLOAD_EXECUTOR under a deadline scaled with the clip duration,
+    paced to its share of the bandwidth budget"""
+    watchdog = DownloadWatchdog(info.get('id'), info.get('duration'))
+    with BANDWIDTH.transfer(host) as transfer:
+        ydl_opts = {**ydl_opts, 'progress_hooks': [watchdog.hook, pacing_hook(transfer)]}
+        future = asyncio.get_running_loop().run_in_executor(DOWNLOAD_EXECUTOR, download_with_ytdlp, info, ydl_opts)
+        try:
+            # The thread cannot be killed, so on timeout it is told to abort and cleans up once it returns
+            return await asyncio.wait_for(asyncio.shield(future), timeout=watchdog.deadline + YTDLP_SOCKET_TIMEOUT)
+        except asyncio.TimeoutError:
+            watchdog.expire(f'overran its {watchdog.deadline:.0f}s deadline')
+            future.add_done_callback(lambda _: remove_partial_download(info))
+            raise WatchdogExpired(f'yt-dlp download of {info.get("id")} {watchdog.expired}')
+        except yt_dlp.utils.DownloadCancelled:
+            remove_partial_download(info)
+            raise WatchdogExpired(f'yt-dlp download of {info.get("id")} {watchdog.expired}')
+
+class AttachmentClient:
+    """Streams Discord attachments to disk in chunks, so their saves are paced like every other transfer"""
+
+    def __init__(self):
+        self._session = None
+
+    @property
+    def session(self):
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession()
+        return self._session
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+    async def save(self, url, filename, transfer):
+        loop = asyncio.get_running_loop()
+        try:
+            async with self.session.get(
+                url,
+                timeout=aiohttp.ClientTimeout(total=None, sock_connect=10, sock_read=YTDLP_SOCKET_TIMEOUT)
+            ) as response:
+                response.raise_for_status()
+                with open(filename, 'wb') as file_handle:
+                    async for chunk in response.content.iter_chunked(BANDWIDTH_CHUNK_SIZE):
+                        await transfer.consume(len(chunk))
+                        await loop.run_in_executor(None, file_handle.write, chunk)
+        except BaseException:
             if os.path.exists(filename):
                 os.remove(filename)
-            return
-        
-        # Schedule clip processing as a background task to avoid blocking
-        asyncio.create_task(process_clip(filename, streamer, title, link, submitter, message.author.id))
+            raise
 
-if __name__ == '__main__':
-    logging.info(f"🚀 Starting bot with backend URL: {BACKEND_URL}")
+ATTACHMENTS = AttachmentClient()
+
+def probe_with_ytdlp(url, ydl_opts):
+    """Blocking metadata-only yt-dlp extraction, meant to run inside DOWNLOAD_EXECUTOR"""
+    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        return ydl.extract_info(url, download=False)
+
+def download_with_ytdlp(info, ydl_opts):
+    """Blocking yt-dlp download of an already probed clip, meant to run inside DOWNLOAD_EXECUTOR"""
+    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        # Reuses the probed metadata instead of extracting the page a second time
+        info = ydl.process_ie_result(info, download=True)
+        return info, ydl.prepare_filename(info or {})
+
+def estimate_download_size(info):
+    """Estimate the size in bytes of the formats yt-dlp selected, or None if unknown"""
+    total = 0
+    for fmt in info.get('requested_formats') or [info]:
+        size = fmt.get('filesize') or fmt.get('filesize_approx')
+        if not size and fmt.get('tbr') and info.get('duration'):
+            size = fmt['tbr'] * 1000 / 8 * info['duration']
+        if not size:
+            return None
+        total += size
+    return int(total)
+
+def check_clip_limits(duration, size):
+    """Return the reason a clip exceeds the configured limits, or None if it is acceptable"""
+    if duration and MAX_CLIP_DURATION and duration > MAX_CLIP_DURATION:
+        return f"duration {duration:.0f}s exceeds {MAX_CLIP_DURATION}s"
+    if size and MAX_CLIP_FILESIZE_MB and size > MAX_CLIP_FILESIZE_MB * 1024 * 1024:
+        return f"size {size / 1024 / 1024:.1f}MB exceeds {MAX_CLIP_FILESIZE_MB}MB"
+    return None
+
+async def download_clip(message, source):
+    """Probe, validate and download one clip of a message and return its processing job, or None"""
+    claimed = []
+    reservation = ('download', message.id, source if isinstance(source, str) else source.id)
+    job = None
+    try:
+        if isinstance(source, str):
+            job = await download_url_clip(message, source, claimed, reservation)
+        else:
+            job = await download_attachment_clip(message, source, claimed, reservation)
+        return job
+    finally:
+        # Keys and disk space of clips that never became a job are released so a later post can go through
+        if job is None:
+            await DEDUP.release(claimed)
+            DISK_BUDGET.release(reservation)
+        else:
+            job['dedup_keys'] = claimed
+            job['disk_reservation'] = reservation
+
+async def download_url_clip(message, url, claimed, reservation):
+    ydl_opts = {
+        'outtmpl': 'downloads/%(id)s.%(ext)s',
+        # Hard ceiling inside yt-dlp; the progress hook paces it down to the current fair share
+        'ratelimit': BANDWIDTH.host_caps.get(bandwidth_host(url)) or BANDWIDTH.limit or None,
+        # Lowest format that still meets the quality floor; below the floor, the best that exists.
+        # No format_sort: it would apply to the fallback too and pick the worst sub-floor format
+        'format': f'w[height>={MIN_CLIP_HEIGHT}]/wv*[height>={MIN_CLIP_HEIGHT}]+ba/bv*+ba/b',
+        'socket_timeout': YTDLP_SOCKET_TIMEOUT,
+    }
+    logging.debug('📥 Received message with URL: %s', url)
+
+    # Reposts of a known clip are dropped before any network request
+    if not await claim_dedup_key(normalize_clip_url(url), claimed):
+        return None
+    
+    loop = asyncio.get_running_loop()
+    with METRICS.timer('metadata'):
+        try:
+            info = await asyncio.wait_for(
+                loop.run_in_executor(DOWNLOAD_EXECUTOR, probe_with_ytdlp, url, ydl_opts),
+                timeout=YTDLP_PROBE_TIMEOUT
+            )
+        except asyncio.TimeoutError:
+            raise WatchdogExpired(f'yt-dlp metadata probe of {url} took longer than {YTDLP_PROBE_TIMEOUT}s')
+    if not info:
+        logging.warning(f'⚠️ No metadata returned for {url}, skipping')
+        METRICS.inc('clip_rejections_total', reason='no_metadata')
+        return None
+    logging.debug('YoutubeDL info: %s', Payload(info))
     
+    # The extractor's own id also catches the same clip posted under a different URL form
+    if info.get('extractor_key') and info.get('id'):
+        source_key = f"{info['extractor_key'].lower()}:{info['id']}"
+        if source_key not in claimed and not await claim_dedup_key(source_key, claimed):
+            return None
+    streamer = info.get('creator') or info.get('channel') or info.get('uploader') or message.author.name
+    
+    # Pre-flight checks before spending bandwidth and disk on the download
+    is_blocked, block_type = is_blacklisted(streamer, message.author.id)
+    if is_blocked:
+        logging.info(f"🚫 Clip blocked before download: {block_type} is blacklisted (submitter: {message.author.name}, streamer: {streamer})")
+        METRICS.inc('clip_rejections_total', reason='blacklisted')
+        return None
+    estimated_size = estimate_download_size(info)
+    rejection = check_clip_limits(info.get('duration'), estimated_size)
+    if rejection:
+        logging.info(f"📏 Clip rejected before download: {rejection} ({url})")
+        METRICS.inc('clip_rejections_total', reason='limits')
+        return None
+    logging.debug('🎯 Selected format %s (%sp) for %s', info.get('format_id'), info.get('height'), url)
+    
+    await DISK_BUDGET.reserve(reservation, clip_footprint(estimated_size))
+
+    with METRICS.timer('download'):
+        info, filename = await download_watched(info, ydl_opts, bandwidth_host(url))
+    return new_job(message, filename, streamer, info.get('title', 'YT Clip'), url)
+
+async def download_attachment_clip(message, attachment, claimed, reservation):
+    streamer = message.author.name
+    
+    # Discord reports the attachment size up front, so no download is needed to validate it
+    is_blocked, block_type = is_blacklisted(streamer, message.author.id)
+    if is_blocked:
+        logging.info(f"🚫 Clip blocked before download: {block_type} is blacklisted (submitter: {message.author.name}, streamer: {streamer})")
+        METRICS.inc('clip_rejections_total', reason='blacklisted')
+        return None
+    rejection = check_clip_limits(None, attachment.size)
+    if rejection:
+        logging.info(f"📏 Attachment rejected before download: {rejection} ({attachment.filename})")
+        METRICS.inc('clip_rejections_total', reason='limits')
+        return None
+    
+    # Attachment ids are unique, so same-named uploads never overwrite each other
+    safe_name = re.sub(r'[^A-Za-z0-9._-]', '_', os.path.basename(attachment.filename))
+    filename = f"downloads/{attachment.id}-{safe_name}"
+    logging.debug('💾 New filename: %s', filename)
+
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+
+    await DISK_BUDGET.reserve(reservation, clip_footprint(attachment.size))
+    with METRICS.timer('download'), BANDWIDTH.transfer(bandwidth_host(attachment.url)) as transfer:
+        await ATTACHMENTS.save(attachment.url, filename, transfer)
+    logging.debug('📁 Saved attachment to: %s', filename)
+    
+    # Hashing is cheap next to a transcode and upload of a clip we already have
+    digest = await asyncio.get_running_loop().run_in_executor(DOWNLOAD_EXECUTOR, file_sha256, filename)
+    if not await claim_dedup_key(f'sha256:{digest}', claimed):
+        os.remove(filename)
+        return None
+    return new_job(message, filename, streamer, "Discord Clip", message.jump_url)
+
+def new_job(message, filename, streamer, title, link):
+    return {
+        'filename': filename,
+        'streamer': streamer,
+        'title': title,
+        'link': link,
+        'submitter': message.author.name,
+        'discord_submitter_id': message.author.id,
+    }
+
+async def download_worker(worker_id):
+    """Pull messages off the download queue and push finished downloads to the clip queue"""
+    while True:
+        received_at, message, source, priority = await DOWNLOAD_QUEUE.get()
+        clip_context = CLIP_CONTEXT.set(uuid.uuid4().hex[:12])
+        logging.info('📥 Download worker %s picked up %s from message %s', worker_id, describe_source(source), message.id)
+        METRICS.observe('clip_queue_wait_seconds', time.monotonic() - received_at, queue='download')
+        try:
+            job = await download_clip(message, source)
+            if job:
+                METRICS.inc('clip_bytes_total', os.path.getsize(job['filename']), direction='downloaded')
+                job['received_at'] = received_at
+                job['queued_at'] = time.monotonic()
+                job['priority'] = priority
+                job['clip_id'] = CLIP_CONTEXT.get()
+                if BOT_MODE == 'ingest':
+                    # Transcode workers lease the job from the shared database
+                    job['job_id'] = await JOB_QUEUE.add(job)
+                    await DEDUP.attach(job['dedup_keys'], job['job_id'])
+                    DISK_BUDGET.rekey(job.pop('disk_reservation'), job['job_id'], clip_footprint(os.path.getsize(job['filename'])))
+                    logging.info(f'📦 Queued job {job["job_id"]} for the transcode workers: {os.path.basename(job["filename"])}')
+                    continue
+                job['job_id'] = await JOB_QUEUE.add(job, claimed_by=WORKER_ID)
+                job['stage'] = 'downloaded'
+                await DEDUP.attach(job['dedup_keys'], job['job_id'])
+                DISK_BUDGET.rekey(job.pop('disk_reservation'), job['job_id'], clip_footprint(os.path.getsize(job['filename'])))
+                ACTIVE_JOB_IDS.add(job['job_id'])
+                await CLIP_QUEUE.put(job)
+                logging.debug('📦 Download worker %s queued %s for processing', worker_id, os.path.basename(job['filename']))
+        except WatchdogExpired as e:
+            # Nothing is stored for the clip yet, so an overrunning download is dropped rather than retried
+            logging.error(f'⏰ Download worker {worker_id} gave up on {describe_source(source)} from message {message.id}: {str(e)}')
+            METRICS.inc('clip_failures_total', reason='watchdog')
+        except Exception as e:
+            logging.error(f'💥 Download worker {worker_id} failed on {describe_source(source)} from message {message.id}: {str(e)}')
+            METRICS.inc('clip_failures_total', reason='download')
+        finally:
+            await PENDING_MESSAGES.finish(message)
+            CLIP_CONTEXT.reset(clip_context)
+            DOWNLOAD_QUEUE.task_done()
+
+async def clip_dispatcher():
+    """Start processing for every finished download; process_clip enforces the concurrency limit"""
+    while True:
+        job = await CLIP_QUEUE.get()
+        if 'queued_at' in job:
+            METRICS.observe('clip_queue_wait_seconds', time.monotonic() - job['queued_at'], queue='clip')
+        try:
+            task = asyncio.create_task(process_clip(job))
+            PIPELINE_TASKS.add(task)
+            task.add_done_callback(PIPELINE_TASKS.discard)
+        finally:
+            CLIP_QUEUE.task_done()
+
+@tasks.loop(seconds=30)
+async def drain_jobs_task():
+    """Lease unfinished jobs whose retry backoff has elapsed: retries, leftovers from a restart, and in
+    worker mode the clips queued by the ingest process"""
+    global JOBS_WAITING
+    await DEDUP.evict()
+    JOBS_WAITING = await JOB_QUEUE.waiting_count()
+    # Keep a few jobs beyond the slot count so the scheduler can still pick the shortest one
+    capacity = TRANSCODE_SCHEDULER.slots * 2 - len(ACTIVE_JOB_IDS)
+    if capacity <= 0:
+        return
+    for job in await JOB_QUEUE.claim_due(WORKER_ID, capacity, exclude=list(ACTIVE_JOB_IDS)):
+        ACTIVE_JOB_IDS.add(job['job_id'])
+        if os.path.exists(job['filename']):
+            # The clip is on disk already; what needs room is its transcode output
+            DISK_BUDGET.hold(job['job_id'], clip_footprint(os.path.getsize(job['filename'])))
+        job['queued_at'] = time.monotonic()
+        if job['attempts']:
+            logging.info(f"🔁 Retrying job {job['job_id']} ({job['stage']}): {os.path.basename(job['filename'])}")
+        else:
+            logging.info(f"📥 Picked up job {job['job_id']}: {os.path.basename(job['filename'])}")
+        await CLIP_QUEUE.put(job)
+
+@tasks.loop(seconds=JOB_LEASE_SECONDS / 3)
+async def renew_leases_task():
+    """Keep the leases of jobs this process is working on from expiring"""
+    if ACTIVE_JOB_IDS:
+        await JOB_QUEUE.renew_leases(WORKER_ID, list(ACTIVE_JOB_IDS))
+
+@tasks.loop(seconds=30)
+async def report_job_status_task():
+    """Ingest mode: log what the transcode workers finished since the last check"""
+    global JOBS_WAITING
+    JOBS_WAITING = await JOB_QUEUE.waiting_count()
+    for row in await JOB_QUEUE.finished_since(report_job_status_task.last_check):
+        if row['stage'] == 'uploaded':
+            logging.info(f"🚀 Job {row['id']} uploaded by {row['claimed_by']}: {os.path.basename(row['filename'])}")
+        else:
+            logging.error(f"🪦 Job {row['id']} failed on {row['claimed_by']}: {row['last_error']}")
+        DISK_BUDGET.release(row['id'])
+        report_job_status_task.last_check = row['updated_at']
+
+report_job_status_task.last_check = time.time()
+
+async def reclaim_orphaned_files():
+    """Delete files in downloads/ that no unfinished job refers to and reserve disk for the ones that remain.
+
+    Orphans are transcode temp files, partial yt-dlp downloads and clips of runs that crashed before
+    queueing them; none of them can be retried. Unless this process runs everything and no worker holds
+    a lease, recent files may belong to another process that is still writing them, so only files older
+    than a lease are removed.
+    """
+    tracked = await JOB_QUEUE.tracked_files()
+    keep = {os.path.normpath(path) for path in (JOB_DB_PATH, f'{JOB_DB_PATH}-wal', f'{JOB_DB_PATH}-shm', f'{JOB_DB_PATH}-journal')}
+    for filename in tracked.values():
+        keep.update(os.path.normpath(path) for path in [filename, *planned_artifacts(filename).values()])
+    alone = BOT_MODE == 'all' and not await JOB_QUEUE.leased_elsewhere(WORKER_ID)
+    cutoff = time.time() - (0 if alone else JOB_LEASE_SECONDS)
+    
+    reclaimed = 0
+    reclaimed_bytes = 0
+    for directory in ('downloads', PENDING_DIR):
+        if not os.path.isdir(directory):
+            continue
+        for entry in os.scandir(directory):
+            if not entry.is_file() or os.path.normpath(entry.path) in keep:
+                continue
+            stat = entry.stat()
+            if stat.st_mtime > cutoff:
+                continue
+            try:
+                os.remove(entry.path)
+            except OSError as e:
+                logging.warning(f"⚠️ Could not remove orphaned file {entry.path}: {e}")
+                continue
+            reclaimed += 1
+            reclaimed_bytes += stat.st_size
+    if reclaimed:
+        logging.warning(f"🧹 Reclaimed {reclaimed} orphaned file(s) ({reclaimed_bytes / 1024 / 1024:.1f}MB) from downloads/")
+    
+    for job_id, filename in tracked.items():
+        if os.path.exists(filename):
+            DISK_BUDGET.hold(job_id, file_footprint(filename))
+    logging.info(f"💽 Disk budget: {DISK_BUDGET.reserved / 1024 / 1024:.0f}MB of "
+                 f"{DISK_BUDGET.limit / 1024 / 1024 if DISK_BUDGET.limit else float('inf'):.0f}MB held by {len(tracked)} unfinished job(s)")
+
+METRICS.gauge('download_queue_depth', 'Messages waiting for a download worker', lambda: DOWNLOAD_QUEUE.qsize() if DOWNLOAD_QUEUE else 0)
+METRICS.gauge('active_jobs', 'Clip jobs currently being processed', lambda: len(ACTIVE_JOB_IDS))
+METRICS.gauge('jobs_waiting', 'Due jobs not leased by any process', lambda: JOBS_WAITING)
+METRICS.gauge('disk_budget_bytes', 'Disk budget for downloads/ (0 means unlimited)', lambda: DISK_BUDGET.limit)
+METRICS.gauge('disk_reserved_bytes', 'Bytes of the disk budget reserved by clip jobs', lambda: DISK_BUDGET.reserved)
+METRICS.gauge('disk_used_bytes', 'Bytes currently stored in downloads/', lambda: DISK_USED_BYTES)
+METRICS.gauge('disk_free_bytes', 'Free space on the downloads volume', lambda: DISK_FREE_BYTES)
+
+def measure_downloads():
+    """Bytes stored in downloads/ and free on its volume"""
+    if not os.path.isdir('downloads'):
+        return 0, 0
+    return directory_bytes('downloads'), shutil.disk_usage('downloads').free
+
+@tasks.loop(seconds=30)
+async def measure_disk_task():
+    """Refresh the disk gauges on a thread; walking a large downloads/ would stall the event loop and every scrape"""
+    global DISK_USED_BYTES, DISK_FREE_BYTES
+    DISK_USED_BYTES, DISK_FREE_BYTES = await asyncio.get_running_loop().run_in_executor(None, measure_downloads)
+
+async def handle_metrics(request):
+    return web.Response(text=METRICS.render(), content_type='text/plain', charset='utf-8')
+
+def health_status():
+    """State of the parts the bot cannot work without, as reported by /health and /ready"""
+    if BOT_MODE == 'worker':
+        gateway = 'unused'
+    elif GATEWAY_DOWN_SINCE is None:
+        gateway = 'connected'
+    else:
+        gateway = 'disconnected'
+    if not TOKENS.token:
+        backend_token = 'missing'
+    elif time.time() >= TOKENS.expires_at:
+        backend_token = 'expired'
+    else:
+        backend_token = 'valid'
+    return {'mode': BOT_MODE, 'gateway': gateway, 'backend_token': backend_token, 'ffmpeg': FFMPEG_STATUS}
+
+async def handle_health(request):
+    """Liveness: fails only on what a restart can fix, a gateway that stays down or an FFmpeg that does not run"""
+    status = health_status()
+    gateway_stuck = GATEWAY_DOWN_SINCE is not None and time.monotonic() - GATEWAY_DOWN_SINCE > HEALTH_GATEWAY_GRACE
+    alive = status['ffmpeg'] not in ('missing', 'error') and not (status['gateway'] == 'disconnected' and gateway_stuck)
+    return web.json_response(status, status=200 if alive else 503)
+
+async def handle_ready(request):
+    """Readiness: connected to Discord, holding a valid backend token and able to run FFmpeg"""
+    status = health_status()
+    ready = status['gateway'] != 'disconnected' and status['backend_token'] == 'valid' and status['ffmpeg'] == 'ok'
+    return web.json_response(status, status=200 if ready else 503)
+
+async def start_metrics_server():
+    """Serve /metrics, /health and /ready on METRICS_HOST:METRICS_PORT for a local Prometheus scraper
+    and the container orchestrator"""
+    global METRICS_SERVER
+    app = web.Application()
+    app.router.add_get('/metrics', handle_metrics)
+    app.router.add_get('/health', handle_health)
+    app.router.add_get('/ready', handle_ready)
+    METRICS_SERVER = web.AppRunner(app, access_log=None)
+    await METRICS_SERVER.setup()
+    await web.TCPSite(METRICS_SERVER, METRICS_HOST, METRICS_PORT).start()
+    logging.info(f"📈 Serving metrics and health checks on http://{METRICS_HOST}:{METRICS_PORT}")
+
+@tasks.loop(minutes=METRICS_SUMMARY_INTERVAL)
+async def metrics_summary_task():
+    """Write what happened since the last summary to the log"""
+    # tasks.loop runs the first iteration immediately, when there is nothing to report yet
+    if metrics_summary_task.current_loop == 0:
+        return
+    lines = METRICS.summary()
+    logging.info("📈 Pipeline summary:\n  " + "\n  ".join(lines))
+
+async def start_pipeline():
+    """Create the job queue and the tasks for this process's role: downloads unless in worker mode,
+    transcodes and uploads unless in ingest mode"""
+    global DOWNLOAD_QUEUE, CLIP_QUEUE, DOWNLOAD_EXECUTOR, JOB_QUEUE, DEDUP, CHECKPOINTS, PENDING_MESSAGES
+    
+    JOB_QUEUE = OffLoop(JobQueue(JOB_DB_PATH))
+    DEDUP = OffLoop(DedupIndex(JOB_DB_PATH))
+    
+    if BOT_MODE != 'worker':
+        # Claims left by downloads that were cut off by a restart would skip every repost of the clip
+        released = await DEDUP.release_abandoned()
+        if released:
+            logging.info(f"♻️ Released {released} dedup key(s) of clips that never became a job")
+        CHECKPOINTS = OffLoop(ChannelCheckpoints(JOB_DB_PATH))
+        PENDING_MESSAGES = PendingMessages(CHECKPOINTS)
+        await hold_catch_up()
+        await reclaim_orphaned_files()
+        DOWNLOAD_QUEUE = asyncio.Queue()
+        DOWNLOAD_EXECUTOR = ThreadPoolExecutor(max_workers=DOWNLOAD_CONCURRENCY, thread_name_prefix='download')
+        for worker_id in range(1, DOWNLOAD_CONCURRENCY + 1):
+            PIPELINE_TASKS.add(asyncio.create_task(download_worker(worker_id)))
+    
+    if BOT_MODE == 'ingest':
+        report_job_status_task.start()
+    else:
+        CLIP_QUEUE = asyncio.Queue()
+        PIPELINE_TASKS.add(asyncio.create_task(clip_dispatcher()))
+        if BOT_MODE == 'worker':
+            drain_jobs_task.change_interval(seconds=WORKER_POLL_INTERVAL)
+        drain_jobs_task.start()
+        renew_leases_task.start()
+    measure_disk_task.start()
+    metrics_summary_task.start()
+
+async def authenticate_with_retries():
+    """Log in to the backend, backing off while it is unreachable"""
     retry_count = 0
     max_retries = 10
     retry_delay = 5
     
-    while not BACKEND_TOKEN and retry_count < max_retries:
+    while not TOKENS.token and retry_count < max_retries:
         try:
-            BACKEND_TOKEN = get_backend_token()
-            if not BACKEND_TOKEN:
+            if not await TOKENS.refresh():
                 retry_count += 1
                 logging.error(f"❌ Failed to get backend token (attempt {retry_count}/{max_retries}), retrying in {retry_delay} seconds...")
-                time.sleep(retry_delay)
+                await asyncio.sleep(retry_delay)
                 retry_delay = min(retry_delay * 1.5, 60)
-        except ConnectionError as e:
+        except (ConnectionError, aiohttp.ClientError, asyncio.TimeoutError) as e:
             retry_count += 1
             logging.error(f"🌐 Backend connection error (attempt {retry_count}/{max_retries}): {e}")
             logging.info(f"⏳ Will retry in {retry_delay} seconds...")
-            time.sleep(retry_delay)
+            await asyncio.sleep(retry_delay)
             retry_delay = min(retry_delay * 1.5, 60)
         except ValueError as e:
             logging.critical(f"🔑 Authentication error, please check credentials: {e}")
@@ -515,12 +2830,116 @@ if __name__ == '__main__':
             retry_count += 1
             logging.error(f"💥 Unexpected error getting token (attempt {retry_count}/{max_retries}): {e}")
             logging.info(f"⏳ Will retry in {retry_delay} seconds...")
-            time.sleep(retry_delay)
+            await asyncio.sleep(retry_delay)
             retry_delay = min(retry_delay * 1.5, 60)
     
     if retry_count >= max_retries:
         logging.warning("⚠️ Max retry attempts reached. Running bot without valid backend token.")
         logging.warning("⚠️ Clip uploads will fail until the backend becomes accessible.")
+
+class BackendStartup:
+    """Backend login and first config fetch, run while the gateway connects. Messages that arrive before it
+    finishes are held, since the clip channels and blacklists are not known yet, and replayed afterwards."""
+
+    def __init__(self):
+        self.finished = False
+        self.held = []
+        # Created on first wait, inside the running loop
+        self._finished_event = None
+
+    async def wait(self):
+        if self.finished:
+            return
+        if self._finished_event is None:
+            self._finished_event = asyncio.Event()
+        await self._finished_event.wait()
+
+    async def run(self):
+        await authenticate_with_retries()
+        
+        try:
+            logging.info("📺 Fetching initial channel configuration...")
+            await fetch_channel_ids()
+            if not CLIP_CHANNEL_IDS:
+                logging.warning("⚠️ No clip channel IDs configured. Bot will run but won't process any clips.")
+            else:
+                logging.info(f"✅ Initial channel IDs loaded: {sorted(CLIP_CHANNEL_IDS)}")
+        except Exception as e:
+            logging.error(f"❌ Error fetching initial channel IDs: {e}")
+            logging.warning("⚠️ Using channel IDs from config file as fallback.")
+        
+        self.finished = True
+        held, self.held = self.held, []
+        if held:
+            logging.info(f"📬 Replaying {len(held)} message(s) received while connecting to the backend")
+        for message in held:
+            await on_message(message)
+        if self._finished_event is not None:
+            self._finished_event.set()
+
+STARTUP = BackendStartup()
+
+async def run_worker():
+    """Worker mode: no Discord connection, only transcode and upload jobs leased from the shared database"""
+    logging.info(f"🛠️ Starting transcode worker {WORKER_ID} on {JOB_DB_PATH}")
+    try:
+        if METRICS_PORT:
+            await start_metrics_server()
+        ffmpeg_check = asyncio.create_task(check_ffmpeg())
+        await authenticate_with_retries()
+        # The admin config carries the slot count and is kept current the same way as in the bot
+        await fetch_channel_ids()
+        CONFIG_SUBSCRIPTION.start()
+        refresh_config_task.start()
+        
+        await start_pipeline()
+        logging.info(f"⚙️ Transcode scheduler: {TRANSCODE_SCHEDULER.slots} slots on {TRANSCODE_SCHEDULER.cores} cores")
+        await asyncio.Event().wait()
+    finally:
+        await CONFIG_SUBSCRIPTION.close()
+        if METRICS_SERVER is not None:
+            await METRICS_SERVER.cleanup()
+        await BACKEND.close()
+
+async def main():
+    async with client:
+        startup_tasks = []
+        try:
+            # Health checks are answered while everything else is still starting
+            if METRICS_PORT:
+                try:
+                    await start_metrics_server()
+                except OSError as e:
+                    logging.error(f"❌ Could not start metrics endpoint on port {METRICS_PORT}: {e}")
+            startup_tasks.append(asyncio.create_task(check_ffmpeg()))
+            
+            await start_pipeline()
+            logging.info(f"⚙️ Started download pool ({DOWNLOAD_CONCURRENCY} workers)")
+            # Import yt-dlp in a thread while connecting, so the first download does not pay for it
+            asyncio.get_running_loop().run_in_executor(DOWNLOAD_EXECUTOR, yt_dlp.load)
+            
+            # Discord connects while the backend login runs; clips posted meanwhile are held, not dropped
+            startup_tasks.append(asyncio.create_task(STARTUP.run()))
+            logging.info("🤖 Starting Discord bot...")
+            await client.start(DISCORD_BOT_TOKEN)
+        finally:
+            for task in startup_tasks:
+                task.cancel()
+            await CONFIG_SUBSCRIPTION.close()
+            if METRICS_SERVER is not None:
+                await METRICS_SERVER.cleanup()
+            await BACKEND.close()
+            await ATTACHMENTS.close()
+
+if __name__ == '__main__':
+    logging.info(f"🚀 Starting bot ({BOT_MODE} mode) with backend URL: {BACKEND_URL}")
+    
+    if BOT_MODE == 'worker':
+        try:
+            asyncio.run(run_worker())
+        except KeyboardInterrupt:
+            pass
+        exit(0)
     
     if not DISCORD_BOT_TOKEN:
         logging.warning("⚠️ No Discord bot token found in config, checking alternative sources")
@@ -528,21 +2947,11 @@ if __name__ == '__main__':
         if not DISCORD_BOT_TOKEN:
             logging.critical("❌ No Discord bot token available. Bot cannot start.")
             exit(1)
-    
-    try:
-        logging.info("📺 Fetching initial channel configuration...")
-        fetch_channel_ids()
-        if not CLIP_CHANNEL_IDS:
-            logging.warning("⚠️ No clip channel IDs configured. Bot will run but won't process any clips.")
-        else:
-            logging.info(f"✅ Initial channel IDs loaded: {CLIP_CHANNEL_IDS}")
-    except Exception as e:
-        logging.error(f"❌ Error fetching initial channel IDs: {e}")
-        logging.warning("⚠️ Using channel IDs from config file as fallback.")
 
     try:
-        logging.info("🤖 Starting Discord bot...")
-        client.run(DISCORD_BOT_TOKEN)
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
     except Exception as e:
         logging.critical(f"💥 Failed to start Discord bot: {e}")
-        exit(1)
\ No newline at end of file
+        exit(1)
@@ -18,3 +18,100 @@ UPLOADBOT_PASSWORD=""
 BACKEND_URL="http://backend:3000"  # Default for Docker environment
 DISCORD_BOT_TOKEN=""
 
+
+# Optional pipeline settings (defaults are used when omitted):
+# DOWNLOAD_CONCURRENCY: Number of clips downloaded in parallel by the download workers
+DOWNLOAD_CONCURRENCY=3
+# MAX_CLIP_DURATION: Clips longer than this many seconds are rejected before downloading
+MAX_CLIP_DURATION=600
+# MAX_CLIP_FILESIZE_MB: Clips larger than this are rejected before downloading
+MAX_CLIP_FILESIZE_MB=500
+# MIN_CLIP_HEIGHT: Quality floor; the lowest format at or above this height is downloaded, or the best one if none reaches it
+MIN_CLIP_HEIGHT=720
+# JOB_DB_PATH: SQLite file that tracks every clip job so failed uploads are retried, even after a restart
+JOB_DB_PATH="downloads/jobs.db"
+# JOB_MAX_ATTEMPTS: Upload attempts before a clip is given up on
+JOB_MAX_ATTEMPTS=10
+# JOB_RETRY_BASE_DELAY: Seconds before the first retry, doubled after every failed attempt (capped at 1 hour)
+JOB_RETRY_BASE_DELAY=30
+# Transcode policy: H.264 clips within all REMUX_* limits are only remuxed (no re-encode),
+# clips up to FAST_ENCODE_MAX_FILESIZE_MB use a fast x264 preset, larger ones get a full re-encode
+REMUX_MAX_BITRATE_KBPS=8000
+REMUX_MAX_HEIGHT=1080
+REMUX_MAX_FILESIZE_MB=100
+FAST_ENCODE_MAX_FILESIZE_MB=250
+FAST_ENCODE_PRESET="veryfast"
+# TRANSCODE_SLOTS: Clips transcoded at once (default: CPU cores / TRANSCODE_THREADS_PER_JOB);
+# the botMaxConcurrentClips admin setting overrides this at runtime
+TRANSCODE_SLOTS=None
+TRANSCODE_THREADS_PER_JOB=4
+# BACKEND_POOL_SIZE / BACKEND_KEEPALIVE_TIMEOUT: Connections kept open to the backend and how long (seconds) idle ones live
+BACKEND_POOL_SIZE=10
+BACKEND_KEEPALIVE_TIMEOUT=60
+# TOKEN_REFRESH_MARGIN: Seconds before the backend token expires that it is refreshed
+TOKEN_REFRESH_MARGIN=300
+# STREAMING_UPLOADS: Pipe FFmpeg output straight into the upload instead of writing a temp file
+# (remux and fast re-encodes only; failures fall back to the file-based path)
+STREAMING_UPLOADS=False
+# Resumable uploads: chunk size in bytes, seconds a chunk may stall, and the slowest acceptable
+# throughput (bytes/second) before the chunk is retried from the backend's acknowledged offset
+UPLOAD_CHUNK_SIZE=8388608
+UPLOAD_STALL_TIMEOUT=30
+UPLOAD_MIN_THROUGHPUT=65536
+UPLOAD_MAX_STALLS=5
+# DEDUP_TTL_HOURS: How long a posted clip (by source id or attachment hash) is remembered and reposts skipped
+DEDUP_TTL_HOURS=168
+# CONFIG_PUSH_UPDATES: Subscribe to the backend's Socket.IO config announcements (needs python-socketio)
+CONFIG_PUSH_UPDATES=True
+# CONFIG_POLL_INTERVAL: Seconds between config checks while the push channel is down
+CONFIG_POLL_INTERVAL=60
+# METRICS_PORT: Local port for the Prometheus-style /metrics endpoint and the /health and /ready checks (0 disables them); METRICS_HOST is the bind address
+METRICS_HOST='127.0.0.1'
+METRICS_PORT=9108
+# METRICS_SUMMARY_INTERVAL: Minutes between pipeline summaries in logs/bot.log
+METRICS_SUMMARY_INTERVAL=15
+# HEALTH_GATEWAY_GRACE: Seconds the Discord gateway may stay disconnected before /health reports the bot as dead
+HEALTH_GATEWAY_GRACE=300
+# FFMPEG_MIN_DEADLINE / FFMPEG_SECONDS_PER_CLIP_SECOND: FFmpeg is killed after min + factor * clip duration seconds
+FFMPEG_MIN_DEADLINE=120
+FFMPEG_SECONDS_PER_CLIP_SECOND=5
+# FFMPEG_STALL_TIMEOUT: Seconds without progress before FFmpeg is killed
+FFMPEG_STALL_TIMEOUT=60
+# YTDLP_PROBE_TIMEOUT: Seconds allowed for yt-dlp to fetch clip metadata
+YTDLP_PROBE_TIMEOUT=60
+# YTDLP_MIN_DEADLINE / YTDLP_SECONDS_PER_CLIP_SECOND / YTDLP_STALL_TIMEOUT: Same limits for yt-dlp downloads
+YTDLP_MIN_DEADLINE=120
+YTDLP_SECONDS_PER_CLIP_SECOND=2
+YTDLP_STALL_TIMEOUT=60
+# WATCHDOG_MAX_ATTEMPTS: Transcodes killed this many times are marked failed instead of retried
+WATCHDOG_MAX_ATTEMPTS=2
+# BOT_MODE: 'all' runs everything in one process; 'ingest' only listens to Discord, downloads and enqueues
+# clips, and 'worker' processes transcode and upload them from the shared JOB_DB_PATH (the BOT_MODE
+# environment variable takes precedence, e.g. docker compose --profile workers up --scale discord-bot-worker=3)
+BOT_MODE='all'
+# JOB_LEASE_SECONDS: A job leased by a worker that stops renewing it is picked up by another after this long
+JOB_LEASE_SECONDS=300
+# WORKER_POLL_INTERVAL: Seconds between checks for new jobs in worker mode
+WORKER_POLL_INTERVAL=5
+# BACKFILL_ENABLED: On startup, process clips posted since the last handled message in each clip channel
+BACKFILL_ENABLED=True
+# BACKFILL_RATE_PER_MINUTE / BACKFILL_MAX_AGE_HOURS: Pace of the catch-up (0 for no limit) and how far back it reaches
+BACKFILL_RATE_PER_MINUTE=6
+BACKFILL_MAX_AGE_HOURS=72
+# BACKFILL_PRIORITY: Job priority of caught-up clips; live clips use 0 and lower values are transcoded first
+BACKFILL_PRIORITY=1
+# POSTER_FORMAT: 'webp' or 'jpg' poster rendered in the same FFmpeg pass as the clip and uploaded with it
+# (None leaves thumbnailing to the backend); PREVIEW_SECONDS adds a low-res preview of that length (0 disables it)
+POSTER_FORMAT='webp'
+PREVIEW_SECONDS=0
+# DISK_BUDGET_MB: Room clip jobs may reserve in downloads/ (source plus transcode output); downloads wait
+# while the budget is full and orphaned files are removed on startup (0 disables the budget)
+DISK_BUDGET_MB=10240
+# BANDWIDTH_LIMIT_MB_PER_SECOND: Total for yt-dlp downloads, attachment saves and uploads, split evenly
+# across the transfers in flight (0 disables it); HOST_BANDWIDTH_CAPS_MB_PER_SECOND caps each clip host
+BANDWIDTH_LIMIT_MB_PER_SECOND=40
+HOST_BANDWIDTH_CAPS_MB_PER_SECOND={'twitch.tv': 10, 'youtube.com': 10, 'medal.tv': 5}
+# LOG_LEVEL: Level of the JSON records in logs/ (DEBUG adds per-clip detail); messages longer than
+# LOG_MAX_MESSAGE_CHARS are cut short
+LOG_LEVEL='INFO'
+LOG_MAX_MESSAGE_CHARS=2000